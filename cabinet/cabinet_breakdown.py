@@ -1,21 +1,14 @@
 import os
-import pandas as pd
+from common.aggregation import operating_budget_cube
 
-def generate_report(path):
-    # Load the data
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
+def generate_report(path, chunksize=None):
     spending_cols = ['FY22 Actual Expense', 'FY23 Actual Expense', 
                      'FY24 Appropriation', 'FY25 Budget']
-    for col in spending_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    # Drop rows with missing values in spending columns
-    df.dropna(subset=spending_cols, inplace=True)
 
-    # Aggregate spending by cabinet (sum amounts for cabinets with multiple entries)
-    df_grouped = df.groupby('Cabinet', as_index=False).sum()
+    # Spending per cabinet from the shared cube (built once from the rows that
+    # have all spending columns, summed over every entry of the cabinet; streamed
+    # in chunks when a chunksize is given)
+    df_grouped = operating_budget_cube(path, chunksize).rollup('Cabinet')
 
     # General Statistics
     num_cabinets = df_grouped['Cabinet'].nunique()
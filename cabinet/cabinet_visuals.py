@@ -1,21 +1,19 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
 import os
+from common.loaders import load_operating_budget
+from common.schema import sum_by
 
 # Ensure the output directory exists
 output_dir = './cabinet/visualizations/'
 os.makedirs(output_dir, exist_ok=True)
 
 def generate_visualization(path):
-    # Load the data
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
-    df = df.replace('#Missing', pd.NA).apply(pd.to_numeric, errors='ignore')
+    # Load the data (names are categories, amounts int64 cents; sum_by returns dollars)
+    df = load_operating_budget(path)
 
     # Aggregate FY25 budget by cabinet
-    fy25_budget = df.groupby('Cabinet')['FY25 Budget'].sum()
+    fy25_budget = sum_by(df, 'Cabinet', 'FY25 Budget')
 
     # Sort the cabinets by their FY25 budget in descending order
     fy25_budget = fy25_budget.sort_values(ascending=False)
@@ -59,18 +57,14 @@ def generate_visualization(path):
 
 def generate_changes(path):
     # Load data
-    df = pd.read_csv(path)
+    df = load_operating_budget(path)
     spending_cols = ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']
 
-    # Ensure columns are numeric
-    for col in spending_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
     # Drop rows with missing values in spending columns
     df.dropna(subset=spending_cols, inplace=True)
 
     # Aggregate total spending over time by cabinet
-    spending_over_time = df.groupby('Cabinet')[spending_cols].sum().reset_index()
+    spending_over_time = sum_by(df, 'Cabinet', spending_cols).reset_index()
 
     # Reshape data for line plot (spending over time by cabinet)
     spending_over_time = spending_over_time.melt(
@@ -107,4 +101,5 @@ def main():
     generate_visualization(path)
     generate_changes(path)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
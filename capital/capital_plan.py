@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from common.aggregation import BudgetCube
+from common.loaders import file_hash
+from common.schema import CENTS_DTYPE, apply_schema, build_code_dictionary, to_dollars
+
+# Adopted five-year capital plan, one row per project (Windows-1252 text)
+CAPITAL_PLAN_PATH = "./data/fy25-fy29-capital-budget-plan-adopted.csv"
+CAPITAL_PLAN_ENCODING = "cp1252"
+
+# Dims of the capital rollups
+CAPITAL_DIMS = ['Department', 'Neighborhood', 'PM_Department', 'Project_Status']
+
+# Money columns by their normalized names. City (general obligation) and grant
+# authorizations are each spent over the same schedule: expended before the
+# current year, Year 0 (the current fiscal year), Year 1 (the plan's first year)
+# and Years 2-5 together.
+AUTHORIZATION_COLS = ['Authorization_Existing', 'Authorization_FY', 'Authorization_Future']
+GRANT_COLS = ['Grant_Existing', 'Grant_FY', 'Grant_Future']
+CITY_SPENDING_COLS = ['GO_Expended', 'Capital_Year_0', 'Capital_Year_1', 'Capital_Year_25']
+GRANT_SPENDING_COLS = ['Grant_Expended', 'Grant_Year_0', 'Grant_Year_1', 'Grant_Year_25']
+CAPITAL_MONEY_COLS = (AUTHORIZATION_COLS + GRANT_COLS + CITY_SPENDING_COLS + GRANT_SPENDING_COLS
+                      + ['External_Funds', 'Total_Project_Budget'])
+
+# Years after the current fiscal year covered by each scheduled spending column
+PLAN_PERIODS = {'Year_0': (0,), 'Year_1': (1,), 'Year_25': (2, 3, 4, 5)}
+FUNDING_SOURCES = {'City': 'Capital', 'Grant': 'Grant'}
+
+# Capital plans already loaded by this process, keyed by (path, file hash)
+_plans = {}
+
+
+def normalize_header(name):
+    # " CapitalYear_1 " -> "Capital_Year_1", " Grant_FY " -> "Grant_FY"
+    name = re.sub(r'\s+', '_', name.strip())
+    return re.sub(r'(?<=[a-z])Year_', '_Year_', name)
+
+
+def plan_first_year(path):
+    # First fiscal year of the plan from its file name ("fy25-fy29-..." -> 2025)
+    match = re.search(r'fy(\d{2})', os.path.basename(path), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"No fiscal year in capital plan file name: {path}")
+    return 2000 + int(match.group(1))
+
+
+def parse_amounts(data):
+    # Money columns as text or numbers ("1,250,000", "$400", "(2,000)", " -   ") in
+    # float dollars; an accounting dash is zero and anything else unparseable is
+    # missing. All columns are parsed as one flat array, and only the entries that
+    # are not plain numbers go through the string cleanup.
+    values = pd.Series(data.to_numpy().ravel())
+    dollars = pd.to_numeric(values, errors='coerce')
+    text = values[dollars.isna() & values.notna()].astype(str).str.strip()
+    negative = text.str.startswith('(') & text.str.endswith(')')
+    cleaned = pd.to_numeric(text.str.replace(r'[$,()\s]', '', regex=True).replace('-', '0'), errors='coerce')
+    dollars[text.index] = cleaned.where(~negative, -cleaned)
+    return pd.DataFrame(dollars.to_numpy().reshape(data.shape), index=data.index, columns=data.columns)
+
+
+def read_capital_plan(path, encoding=CAPITAL_PLAN_ENCODING):
+    # One plan as read: normalized headers, text stripped, money in float dollars and
+    # the plan's first fiscal year in Plan_Year
+    plan = pd.read_csv(path, encoding=encoding, dtype=str)
+    plan.columns = [normalize_header(col) for col in plan.columns]
+    money = [col for col in plan.columns if col in CAPITAL_MONEY_COLS]
+    for col in plan.columns.difference(money):
+        plan[col] = plan[col].str.strip()
+    plan[money] = parse_amounts(plan[money])
+    plan['Plan_Year'] = plan_first_year(path)
+    return plan
+
+
+def load_capital_plans(paths, encoding=CAPITAL_PLAN_ENCODING):
+    # Projects of one or more plans in one frame, in the typed schema: the dims are
+    # categoricals over one code dictionary shared by every plan and the money
+    # columns are int64 cents
+    frames = []
+    for path in paths:
+        key = (os.path.abspath(path), file_hash(path))
+        if key not in _plans:
+            _plans[key] = read_capital_plan(path, encoding)
+        frames.append(_plans[key])
+    plan = pd.concat(frames, ignore_index=True)
+    return apply_schema(plan, build_code_dictionary(plan, CAPITAL_DIMS), CAPITAL_MONEY_COLS)
+
+
+def load_capital_plan(path=CAPITAL_PLAN_PATH):
+    return load_capital_plans([path])
+
+
+def project_table(plan):
+    # Funding and schedule totals of every project, as whole-column operations in
+    # cents. Unscheduled is the part of the city authorization with no spending
+    # year (zero when the plan balances), Remaining what is still to be spent.
+    table = plan.copy()
+    table['City_Authorization'] = plan[AUTHORIZATION_COLS].sum(axis=1, min_count=1)
+    table['Grant_Authorization'] = plan[GRANT_COLS].sum(axis=1, min_count=1)
+    table['Unscheduled'] = table['City_Authorization'] - plan[CITY_SPENDING_COLS].sum(axis=1, min_count=1)
+    table['Expended'] = plan['GO_Expended'] + plan['Grant_Expended']
+    table['Remaining'] = table['City_Authorization'] + table['Grant_Authorization'] - table['Expended']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        funded = (table['City_Authorization'] + table['Grant_Authorization']).astype('float64')
+        table['Pct_Expended'] = table['Expended'].astype('float64') / funded.where(funded != 0)
+    return table
+
+
+def capital_cube(plan, dims=CAPITAL_DIMS, measures=CAPITAL_MONEY_COLS):
+    # Rollups of the money columns by any cross of the dims, from one pass over the
+    # projects (include Plan_Year in the dims when the frame holds several plans)
+    return BudgetCube(plan, dims, measures)
+
+
+def cash_flow(plan, by=()):
+    # Scheduled spending by fiscal year, from the current year to the plan's last
+    # year, city and grant funded, summed per group of `by` (in dollars). Years 2-5
+    # are one column in the plan and are spread evenly over those years in whole
+    # cents (the remainder in the last year). The project-by-year table of every
+    # plan is built in one pass: one column operation per scheduled column.
+    by = [by] if isinstance(by, str) else list(by)
+    years = np.arange(max(max(offsets) for offsets in PLAN_PERIODS.values()) + 1)
+    rows = np.repeat(np.arange(len(plan)), len(years))
+
+    flows = {dim: plan[dim].array.take(rows) for dim in by}
+    flows['Fiscal_Year'] = (plan['Plan_Year'].to_numpy()[:, None] - 1 + years).ravel()
+    for source, prefix in FUNDING_SOURCES.items():
+        schedule = np.zeros((len(plan), len(years)), dtype=np.int64)
+        for period, offsets in PLAN_PERIODS.items():
+            cents = plan[f"{prefix}_{period}"].fillna(0).to_numpy(dtype=np.int64)
+            share = cents // len(offsets)
+            schedule[:, list(offsets)] = share[:, None]
+            schedule[:, offsets[-1]] += cents - share * len(offsets)
+        flows[source] = schedule.ravel()
+
+    grouped = pd.DataFrame(flows).groupby(by + ['Fiscal_Year'], observed=True, sort=True).sum().reset_index()
+    grouped['Total'] = grouped['City'] + grouped['Grant']
+    return to_dollars(grouped.astype({col: CENTS_DTYPE for col in ['City', 'Grant', 'Total']}),
+                      ['City', 'Grant', 'Total'])
+
+
+def generate_report(path=CAPITAL_PLAN_PATH, output_path="./capital/capital_report.txt"):
+    plan = load_capital_plan(path)
+    projects = to_dollars(project_table(plan), CAPITAL_MONEY_COLS + ['City_Authorization', 'Grant_Authorization',
+                                                                     'Unscheduled', 'Expended', 'Remaining'])
+    cube = capital_cube(plan)
+    flows = cash_flow(plan)
+    first_year = int(plan['Plan_Year'].min())
+
+    with open(output_path, 'w') as file:
+        file.write(f"===== FY{first_year % 100}-FY{(first_year + 4) % 100} Capital Plan =====\n")
+        file.write(f"Projects: {len(projects)}\n")
+        file.write(f"Total Project Budget: ${projects['Total_Project_Budget'].sum():,.2f}\n")
+        file.write(f"City Authorization: ${projects['City_Authorization'].sum():,.2f}\n")
+        file.write(f"Grant Authorization: ${projects['Grant_Authorization'].sum():,.2f}\n")
+        file.write(f"External Funds: ${projects['External_Funds'].sum():,.2f}\n")
+        file.write(f"Expended to Date: ${projects['Expended'].sum():,.2f}\n")
+        file.write(f"Remaining to Spend: ${projects['Remaining'].sum():,.2f}\n")
+        file.write(f"Unscheduled City Authorization: ${projects['Unscheduled'].sum():,.2f}\n")
+
+        file.write("\n===== Cash Flow by Fiscal Year =====\n")
+        for _, row in flows.iterrows():
+            file.write(f"FY{int(row['Fiscal_Year']) % 100}: City ${row['City']:,.2f}, Grant ${row['Grant']:,.2f}, "
+                       f"Total ${row['Total']:,.2f}\n")
+
+        for dim in CAPITAL_DIMS:
+            totals = cube.rollup(dim).sort_values('Total_Project_Budget', ascending=False)
+            file.write(f"\n===== Total Project Budget by {dim.replace('_', ' ')} =====\n")
+            for _, row in totals.iterrows():
+                file.write(f"- {row[dim]}: ${row['Total_Project_Budget']:,.2f}\n")
+
+        file.write("\n===== End of Report =====\n")
+    return 1
+
+
+def scale_capital_plan(path, directory, plans):
+    # Write the plan once per plan year, FY25-FY29 back to earlier five-year plans,
+    # to benchmark many years of capital plans
+    first_year = plan_first_year(path)
+    with open(path, 'rb') as file:
+        content = file.read()
+    paths = []
+    for i in range(plans):
+        year = first_year - i
+        paths.append(os.path.join(directory, f"fy{year % 100:02d}-fy{(year + 4) % 100:02d}-capital-plan-{i}.csv"))
+        with open(paths[-1], 'wb') as file:
+            file.write(content)
+    return paths
+
+
+def benchmark(plans=100):
+    # Load, every rollup and the cash flow of many stacked plans, against the
+    # previous way of answering each question: a groupby of the projects per rollup
+    with tempfile.TemporaryDirectory() as directory:
+        paths = scale_capital_plan(CAPITAL_PLAN_PATH, directory, plans)
+        start = time.perf_counter()
+        plan = load_capital_plans(paths)
+        load_time = time.perf_counter() - start
+
+    dims = ['Plan_Year'] + CAPITAL_DIMS
+    start = time.perf_counter()
+    rollups = capital_cube(plan, dims).all_rollups()
+    cube_time = time.perf_counter() - start
+
+    dollars = to_dollars(plan, CAPITAL_MONEY_COLS)
+    start = time.perf_counter()
+    for combo in rollups:
+        dollars.groupby(list(combo), as_index=False, sort=True)[CAPITAL_MONEY_COLS].sum()
+    groupby_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    flows = cash_flow(plan, ['Plan_Year', 'Department'])
+    flow_time = time.perf_counter() - start
+    print(f"{plans} plans, {len(plan):,} projects loaded in {load_time:.2f}s")
+    print(f"{len(rollups)} rollups: cube {cube_time:.2f}s, a groupby per rollup {groupby_time:.2f}s")
+    print(f"Cash flow by plan, department and year ({len(flows):,} rows): {flow_time:.3f}s")
+
+
+def test_capital_plan():
+    plan = load_capital_plan()
+
+    # Headers are normalized and every money column is typed
+    assert {'Grant_Existing', 'Capital_Year_1', 'Grant_Year_1', 'Grant_Year_25'} <= set(plan.columns)
+    assert all(str(plan[col].dtype) == CENTS_DTYPE for col in CAPITAL_MONEY_COLS)
+    assert (plan['Plan_Year'] == 2025).all()
+    assert normalize_header(' GrantYear_25 ') == 'Grant_Year_25'
+    amounts = parse_amounts(pd.DataFrame({'a': [' 1,250 ', '$400', '(2,000)'], 'b': [' -   ', 'n/a', '7']}))
+    assert amounts['a'].tolist() == [1250, 400, -2000]
+    assert amounts['b'].isna().tolist() == [False, True, False] and amounts.loc[[0, 2], 'b'].tolist() == [0, 7]
+
+    # The plan balances: authorizations are fully scheduled and add up to the budget
+    projects = project_table(plan)
+    assert (projects['Unscheduled'] == 0).all()
+    assert (projects['City_Authorization'] + projects['Grant_Authorization'] + projects['External_Funds']
+            == projects['Total_Project_Budget']).all()
+
+    # Rollups match a groupby of the projects
+    dollars = to_dollars(plan, CAPITAL_MONEY_COLS)
+    cube = capital_cube(plan)
+    for dims in [['Department'], ['Neighborhood', 'Project_Status']]:
+        expected = dollars.groupby(dims, as_index=False, observed=True)[CAPITAL_MONEY_COLS].sum()
+        pd.testing.assert_frame_equal(cube.rollup(dims), expected, check_exact=False)
+
+    # The cash flow spends exactly the scheduled amounts, Years 2-5 spread over FY26-FY29
+    flows = cash_flow(plan).set_index('Fiscal_Year')
+    assert flows.index.tolist() == list(range(2024, 2030))
+    assert flows.loc[2024, 'City'] == dollars['Capital_Year_0'].sum()
+    assert flows.loc[2025, 'Grant'] == dollars['Grant_Year_1'].sum()
+    assert round(flows.loc[2026:2029, 'City'].sum(), 2) == round(dollars['Capital_Year_25'].sum(), 2)
+    by_department = cash_flow(plan, 'Department')
+    assert np.isclose(by_department['Total'].sum(), flows['Total'].sum())
+    assert by_department['Department'].dtype == object
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        generate_report()
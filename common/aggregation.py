@@ -0,0 +1,263 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from itertools import combinations
+import numpy as np
+import pandas as pd
+from common.loaders import (OPERATING_BUDGET_PATH, SPENDING_COLS, STREAM_CHUNKSIZE, file_hash,
+                            iter_operating_budget, load_operating_budget)
+from common.schema import HIERARCHY, apply_schema, drop_missing, is_cents, to_cents, to_dollars
+
+# Partial sums are merged once they hold this many rows, so memory stays bounded by
+# the chunk size and the number of distinct leaves rather than the number of chunks
+COMPACT_ROWS = 1_000_000
+
+# Cubes already built by this process, keyed by (path, file hash)
+_cubes = {}
+
+
+class BudgetCube:
+    # Sums of the measures for every combination of the dims, computed from a
+    # single pass over the line items. The pass groups rows into leaf cells
+    # (one per distinct combination of all dims) on integer category codes;
+    # every rollup is then a regroup of the smallest finer table already
+    # computed (the leaves at first), never of the data.
+    # Measures in cents are summed exactly and returned by rollups in dollars.
+    def __init__(self, df, dims=HIERARCHY, measures=SPENDING_COLS):
+        self.dims = list(dims)
+        self.measures = list(measures)
+        self.cents = all(is_cents(df[measure]) for measure in self.measures)
+
+        # Categorical codes for each dim (the schema's own codes when the column is
+        # already categorical); missing values get code -1
+        self.categories = {}
+        codes = {}
+        for dim in self.dims:
+            if isinstance(df[dim].dtype, pd.CategoricalDtype):
+                codes[dim], self.categories[dim] = df[dim].cat.codes.to_numpy(), df[dim].cat.categories
+            else:
+                codes[dim], self.categories[dim] = pd.factorize(df[dim], sort=True)
+        self.names = {dim: np.asarray(categories, dtype=object) for dim, categories in self.categories.items()}
+
+        # The single pass over the data: rows are summed per leaf on the integer codes
+        # (code -1 is kept as its own group so missing values stay out of every rollup
+        # that includes that dim, like groupby() does, but still count in the others)
+        sums = df[self.measures].groupby([codes[dim] for dim in self.dims], sort=True).sum()
+
+        # The leaf table as two arrays, the dims' codes and the measure sums (exact
+        # int64 cents, so every rollup adds integers), and the cell tables summed
+        # from it, keyed by their dims
+        leaf_sums = sums.to_numpy(dtype=np.int64) if self.cents else sums.to_numpy()
+        self._leaves = (sums.index.to_frame().to_numpy(dtype=np.int64), leaf_sums)
+        self._cells = {}
+
+        # Dims with missing values; a cell table has left out the rows missing any of
+        # its own dims, so it only stands in for the leaves in rollups of those dims
+        self._missing = {dim for dim, column in zip(self.dims, self._leaves[0].T) if (column < 0).any()}
+        self._rollups = {}
+
+    @classmethod
+    def from_chunks(cls, chunks, dims=HIERARCHY, measures=SPENDING_COLS):
+        # Build the cube from an iterator of frames (e.g. a chunked read_csv), summing
+        # each chunk per leaf and merging the partial sums, so no more than one chunk
+        # of line items is ever in memory
+        return cls(combine_partial_sums(chunks, dims, measures), dims, measures)
+
+    def rollup(self, dims):
+        # Totals grouped by the given dims, in sorted order like groupby().sum();
+        # rows whose value is missing for any of these dims are left out, and dims
+        # with categories that never occur in the data have no rows
+        dims = [dims] if isinstance(dims, str) else list(dims)
+        key = tuple(dims)
+        if key not in self._rollups:
+            codes, totals = self._cell_table(key)
+            columns = {dim: self.names[dim].take(codes[:, i]) for i, dim in enumerate(dims)}
+            columns.update(zip(self.measures, (totals / 100 if self.cents else totals).T))
+            self._rollups[key] = pd.DataFrame(columns)
+        return self._rollups[key].copy()
+
+    def _cell_table(self, key):
+        # Codes and sums of the cells of the dims in key, summed from the smallest
+        # table already computed whose dims include them (the leaves at first) and
+        # that left out no rows this rollup keeps
+        if key not in self._cells:
+            tables = [(tuple(self.dims), self._leaves)]
+            tables += [(dims, table) for dims, table in self._cells.items()
+                       if set(key) <= set(dims) and self._missing & set(dims) <= set(key)]
+            source, (source_codes, sums) = min(tables, key=lambda item: len(item[1][0]))
+            codes = source_codes[:, [source.index(dim) for dim in key]]
+            complete = (codes >= 0).all(axis=1)
+            if not complete.all():
+                codes, sums = codes[complete], sums[complete]
+
+            # One integer per cell (the dims' codes in mixed radix, so cell order is
+            # name order); one sort brings each cell's rows together and every run
+            # is summed with a single reduceat over all measures
+            shape = [len(self.categories[dim]) for dim in key]
+            cells = np.ravel_multi_index(codes.T, shape) if len(codes) else np.zeros(0, dtype=np.int64)
+            order = np.argsort(cells, kind="stable")
+            cells = cells[order]
+            starts = np.flatnonzero(np.diff(cells, prepend=-1))
+            totals = np.add.reduceat(sums[order], starts, axis=0) if len(cells) else sums[:0]
+            self._cells[key] = (np.column_stack(np.unravel_index(cells[starts], shape)), totals)
+        return self._cells[key]
+
+    def hierarchy_levels(self):
+        # Cabinet, Cabinet/Dept, Cabinet/Dept/Program, ... down to the leaves (the
+        # finest level is summed first, so each level comes from the one below it)
+        levels = [tuple(self.dims[:i]) for i in range(len(self.dims), 0, -1)]
+        rollups = {level: self.rollup(level) for level in levels}
+        return {level: rollups[level] for level in reversed(levels)}
+
+    def all_rollups(self):
+        # Every cross of the dims, e.g. ('Cabinet', 'Expense Category'); the crosses
+        # of more dims are summed first, so the others come from the smaller tables
+        combos = [combo for n in range(1, len(self.dims) + 1) for combo in combinations(self.dims, n)]
+        rollups = {combo: self.rollup(combo) for combo in reversed(combos)}
+        return {combo: rollups[combo] for combo in combos}
+
+
+def combine_partial_sums(chunks, dims, measures, compact_rows=COMPACT_ROWS):
+    # Sum of the measures per distinct combination of the dims over all chunks.
+    # Each chunk is reduced to its own per-leaf sums (missing dim values kept as
+    # their own group); the partials are merged whenever they grow past compact_rows
+    dims = list(dims)
+    measures = list(measures)
+    partials = []
+    partial_rows = 0
+    for chunk in chunks:
+        partial = chunk.groupby(dims, sort=False, dropna=False)[measures].sum()
+        partials.append(partial)
+        partial_rows += len(partial)
+        if partial_rows > compact_rows and len(partials) > 1:
+            partials = [merge_partial_sums(partials)]
+            partial_rows = len(partials[0])
+
+    if not partials:
+        return pd.DataFrame(columns=dims + measures)
+    return merge_partial_sums(partials).reset_index()
+
+
+def merge_partial_sums(partials):
+    combined = pd.concat(partials)
+    return combined.groupby(level=list(range(combined.index.nlevels)), sort=False, dropna=False).sum()
+
+
+def operating_budget_chunks(path, chunksize):
+    # Streamed rows that have all spending columns, with the amounts in int64 cents
+    for chunk in iter_operating_budget(path, chunksize):
+        chunk = chunk.dropna(subset=SPENDING_COLS)
+        for col in SPENDING_COLS:
+            chunk[col] = to_cents(chunk[col])
+        yield chunk
+
+
+def operating_budget_cube(path=OPERATING_BUDGET_PATH, chunksize=None):
+    # Cube over the operating budget rows that have all four spending columns,
+    # the same rows the breakdown reports have always aggregated. With a chunksize
+    # (or BUDGET_CHUNKSIZE set) the CSV is streamed instead of loaded whole.
+    chunksize = chunksize or STREAM_CHUNKSIZE
+    key = (os.path.abspath(path), file_hash(path))
+    if key not in _cubes:
+        if chunksize:
+            _cubes[key] = BudgetCube.from_chunks(operating_budget_chunks(path, chunksize))
+        else:
+            _cubes[key] = BudgetCube(drop_missing(load_operating_budget(path), SPENDING_COLS))
+    return _cubes[key]
+
+
+def test_cube():
+    path = "./data/fy25-adopted-operating-budget.csv"
+    df = to_dollars(load_operating_budget(path))
+    df.dropna(subset=SPENDING_COLS, inplace=True)
+    cube = operating_budget_cube(path)
+
+    # Every hierarchy level and cross matches a direct groupby over the line items,
+    # whether it is summed from the leaves or from a finer rollup
+    rollups = cube.all_rollups()
+    assert len(rollups) == 2 ** len(HIERARCHY) - 1
+    for dims in [['Cabinet'], ['Cabinet', 'Dept', 'Program'], ['Dept', 'Expense Category'], HIERARCHY]:
+        expected = df.groupby(dims, as_index=False)[SPENDING_COLS].sum()
+        pd.testing.assert_frame_equal(cube.rollup(dims), expected, check_exact=False)
+        pd.testing.assert_frame_equal(rollups[tuple(dims)], expected, check_exact=False)
+
+    # A finer rollup that left out rows with a missing Dept is not reused for the
+    # rollups without Dept
+    gaps = df.head(50).assign(Dept=df['Dept'].head(50).where(lambda dept: dept.index % 3 != 0))
+    cube = BudgetCube(gaps)
+    cube.rollup(['Cabinet', 'Dept'])
+    expected = gaps.groupby('Cabinet', as_index=False)[SPENDING_COLS].sum()
+    pd.testing.assert_frame_equal(cube.rollup('Cabinet'), expected, check_exact=False)
+
+
+def test_streamed_cube():
+    path = "./data/fy25-adopted-operating-budget.csv"
+    cube = operating_budget_cube(path)
+
+    # Streaming in small chunks (with merges forced along the way) gives the same rollups
+    chunks = operating_budget_chunks(path, chunksize=100)
+    streamed = BudgetCube(combine_partial_sums(chunks, HIERARCHY, SPENDING_COLS, compact_rows=200))
+    for dims in [['Cabinet'], ['Program'], ['Expense Category'], ['Cabinet', 'Dept', 'Program']]:
+        pd.testing.assert_frame_equal(streamed.rollup(dims), cube.rollup(dims), check_exact=False)
+
+
+def test_streamed_cube_coerces_like_whole_file(tmp_path):
+    # Non-numeric amounts other than '#Missing' are missing in both paths, so the
+    # row is dropped by both instead of failing the streamed read
+    path = tmp_path / "budget.csv"
+    pd.read_csv(OPERATING_BUDGET_PATH, nrows=50).astype({'FY25 Budget': object}).assign(
+        **{'FY25 Budget': lambda df: df['FY25 Budget'].where(df.index != 3, 'n/a')}).to_csv(path, index=False)
+    df = load_operating_budget(str(path)).dropna(subset=SPENDING_COLS)
+    whole = BudgetCube(df)
+    streamed = BudgetCube.from_chunks(operating_budget_chunks(str(path), chunksize=7))
+    pd.testing.assert_frame_equal(streamed.rollup('Program'), whole.rollup('Program'), check_exact=False)
+
+
+def scale_operating_budget(path, out_path, factor, cities=5):
+    # Write the operating budget factor times over, as yearly budgets of several
+    # cities (each city's cabinets renamed), to benchmark large inputs
+    df = pd.read_csv(path)
+    with open(out_path, 'w', newline='') as file:
+        for i in range(factor):
+            copy = df.assign(Cabinet=df['Cabinet'] + f" (city {i % cities})")
+            copy.to_csv(file, index=False, header=(i == 0))
+
+
+def benchmark_streaming(factor=500, chunksize=50_000, path=OPERATING_BUDGET_PATH):
+    # Time and peak Python memory of building the cube from the whole file against
+    # streaming it (memory is traced in a separate run, as tracing slows pandas down)
+    def measure(build):
+        start = time.perf_counter()
+        cube = build()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        build()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return cube, elapsed, peak
+
+    with tempfile.TemporaryDirectory() as tmp:
+        big_path = os.path.join(tmp, "operating_budget_scaled.csv")
+        scale_operating_budget(path, big_path, factor)
+        rows = factor * len(pd.read_csv(path))
+        size = os.path.getsize(big_path)
+
+        def whole():
+            df = pd.read_csv(big_path)
+            return BudgetCube(drop_missing(apply_schema(df), SPENDING_COLS))
+
+        def streamed():
+            return BudgetCube.from_chunks(operating_budget_chunks(big_path, chunksize))
+
+        whole_cube, whole_time, whole_peak = measure(whole)
+        streamed_cube, streamed_time, streamed_peak = measure(streamed)
+        pd.testing.assert_frame_equal(streamed_cube.rollup('Cabinet'), whole_cube.rollup('Cabinet'), check_exact=False)
+
+    print(f"{rows:,} rows, {size / 1e6:.0f} MB CSV, chunks of {chunksize:,} rows")
+    print(f"Whole file: {whole_time:6.2f}s, peak memory {whole_peak / 1e6:8.1f} MB")
+    print(f"Streamed:   {streamed_time:6.2f}s, peak memory {streamed_peak / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    benchmark_streaming()
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import tempfile
+from functools import lru_cache
+import pandas as pd
+from common.schema import MONEY_COLS, apply_schema
+
+OPERATING_BUDGET_PATH = "./data/fy25-adopted-operating-budget.csv"
+SPENDING_COLS = MONEY_COLS
+
+# Fixed column types for streamed reads, so every chunk parses the same way. The
+# spending columns are read as text and converted like the whole-file path does
+# (to_numeric with errors='coerce'), so '#Missing' and any other non-numeric entry
+# is missing in both instead of failing the streamed read
+OPERATING_BUDGET_DTYPES = {'Cabinet': str, 'Dept': str, 'Program': str, 'Expense Category': str,
+                           **{col: str for col in SPENDING_COLS}}
+
+# Rows per chunk when the report generators stream the operating budget instead of
+# loading it whole; set BUDGET_CHUNKSIZE to turn streaming on for every generator
+STREAM_CHUNKSIZE = int(os.environ.get('BUDGET_CHUNKSIZE', 0)) or None
+
+# Parsed copies of the source CSVs, keyed by the hash of the file contents
+CACHE_DIR = "./data/.cache"
+
+# Parsing and schema code; a change to either file changes every cache key, so a
+# frame parsed by older code is never loaded as if it were current
+LOADER_SOURCES = ["loaders.py", "schema.py"]
+
+# Frames already loaded by this process, keyed by (path, file hash, options)
+_loaded = {}
+
+
+def file_hash(path):
+    # SHA-256 of the file contents, read in blocks so large files are fine
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# SHA-256 of the parsing and schema source files, read once per process
+@lru_cache(maxsize=None)
+def source_digest(sources=tuple(LOADER_SOURCES)):
+    digest = hashlib.sha256()
+    for name in sources:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def write_parquet(df, path):
+    # Write to a temporary file next to path and move it into place, so a reader
+    # (or a run that is interrupted) never sees a half-written cache file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".parquet.tmp")
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def load_csv(path, numeric_cols=(), schema=False):
+    # Parse a CSV once, convert numeric_cols with to_numeric(errors='coerce'),
+    # optionally apply the typed schema (categorical hierarchy, int64 cents), and
+    # cache the typed result as Parquet; later loads of the same bytes, parsed by
+    # the same loader and schema code, reuse it
+    numeric_cols = tuple(numeric_cols)
+    key = file_hash(path)
+    memo_key = (os.path.abspath(path), key, numeric_cols, schema)
+    if memo_key not in _loaded:
+        name = os.path.splitext(os.path.basename(path))[0]
+        columns_key = hashlib.sha256(repr((numeric_cols, schema, source_digest())).encode()).hexdigest()[:8]
+        cache_path = os.path.join(CACHE_DIR, f"{name}-{key[:16]}-{columns_key}.parquet")
+
+        if os.path.exists(cache_path):
+            df = pd.read_parquet(cache_path)
+        else:
+            df = pd.read_csv(path)
+            for col in numeric_cols:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            if schema:
+                df = apply_schema(df)
+            write_parquet(df, cache_path)
+        _loaded[memo_key] = df
+
+    # Callers modify their frame in place, so each gets its own copy
+    return _loaded[memo_key].copy()
+
+
+def load_operating_budget(path=OPERATING_BUDGET_PATH):
+    # Operating budget in the typed schema: the hierarchy columns are categoricals
+    # over one code dictionary and the four FY spending columns are cents
+    # ('#Missing' and other non-numeric entries are missing, so a column that has
+    # any is nullable Int64 rather than int64); use
+    # common.schema.sum_by / to_dollars to get dollar amounts back
+    return load_csv(path, SPENDING_COLS, schema=True)
+
+
+def iter_csv_chunks(path, chunksize, dtype=None, na_values=None, usecols=None):
+    # Read a CSV chunksize rows at a time with fixed column types; only one chunk
+    # is held in memory, however large the file
+    with pd.read_csv(path, chunksize=chunksize, dtype=dtype, na_values=na_values,
+                     usecols=usecols) as reader:
+        yield from reader
+
+
+def iter_operating_budget(path=OPERATING_BUDGET_PATH, chunksize=100_000):
+    # Operating budget rows in chunks, with the spending columns converted to float
+    # dollars like load_csv() does
+    for chunk in iter_csv_chunks(path, chunksize, dtype=OPERATING_BUDGET_DTYPES, usecols=list(OPERATING_BUDGET_DTYPES)):
+        yield chunk.assign(**{col: pd.to_numeric(chunk[col], errors='coerce') for col in SPENDING_COLS})
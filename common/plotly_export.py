@@ -0,0 +1,314 @@
+import base64
+import html
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+import numpy as np
+import plotly
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+# Files written for every interactive figure
+FORMATS = ("html", "png")
+
+# In shared mode every HTML page loads this one copy of plotly.js (versioned, so a
+# browser cache never serves a stale bundle) instead of embedding its own. The
+# bundle is generated on export and git-ignored, like the other build outputs.
+SHARED_ASSET = f"./assets/plotly-{plotly.__version__}.min.js"
+
+# Byte budget of each figure's HTML page, e.g. PLOTLY_PAYLOAD_BUDGET=250000
+PAYLOAD_BUDGET = int(os.environ.get("PLOTLY_PAYLOAD_BUDGET", 500_000))
+
+# Shorter numeric arrays are left as plain JSON lists
+MIN_ENCODED_LENGTH = 8
+
+# Restores the encoded trace arrays (see encode_array) before plotting
+DECODER_JS = """
+function decodeArrays(value) {
+  if (Array.isArray(value)) return value.map(decodeArrays);
+  if (value === null || typeof value !== "object") return value;
+  if ("__delta__" in value) {
+    let total = 0;
+    return value.__delta__.map(step => (total += step));
+  }
+  if ("__f4__" in value) {
+    const bytes = Uint8Array.from(atob(value.__f4__), c => c.charCodeAt(0));
+    return Array.from(new Float32Array(bytes.buffer));
+  }
+  for (const key in value) value[key] = decodeArrays(value[key]);
+  return value;
+}
+const figure = decodeArrays(JSON.parse(document.getElementById("figure-data").textContent));
+Plotly.newPlot("figure", figure.data, figure.layout, {responsive: true});
+"""
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title><script src="{script}"></script></head>
+<body>
+<div id="figure" style="height:100vh"></div>
+<script type="application/json" id="figure-data">{payload}</script>
+<script>{decoder}</script>
+</body>
+</html>
+"""
+
+
+def encode_array(values):
+    # Compact form of a 1-D numeric trace array, or None to keep it as it is:
+    # whole numbers (years, whole-dollar amounts) as exact integer deltas, which are
+    # a few characters each, and other numbers as base64 float32 (about 7
+    # significant digits, enough to draw and hover on)
+    if isinstance(values, (list, tuple)):
+        if not values or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return None
+        values = np.asarray(values, dtype=float)
+    if not isinstance(values, np.ndarray) or values.ndim != 1 or len(values) < MIN_ENCODED_LENGTH:
+        return None
+    if values.dtype.kind not in "iuf" or not np.isfinite(values).all():
+        return None
+    if (values == np.round(values)).all() and np.abs(values).max() < 2 ** 53:
+        return {"__delta__": np.diff(values.astype(np.int64), prepend=0).tolist()}
+    return {"__f4__": base64.b64encode(values.astype("<f4").tobytes()).decode("ascii")}
+
+
+def _encode_arrays(value):
+    if isinstance(value, dict):
+        return {key: _encode_arrays(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [_encode_arrays(item) for item in value]
+    encoded = encode_array(value)
+    return value if encoded is None else encoded
+
+
+def compact_figure_json(fig):
+    # Figure JSON without whitespace and with the traces' numeric arrays encoded
+    figure = fig.to_plotly_json()
+    figure["data"] = [_encode_arrays(trace) for trace in figure["data"]]
+    return json.dumps(figure, cls=PlotlyJSONEncoder, separators=(",", ":"))
+
+
+def shared_page(fig, script):
+    # HTML page for one figure: loads plotly.js from `script` and carries the compact
+    # figure JSON inline (so it also opens from disk, where fetch is blocked)
+    title = fig.layout.title.text or "Figure"
+    payload = compact_figure_json(fig).replace("</", "<\\/")
+    return PAGE_TEMPLATE.format(title=html.escape(title), script=script, payload=payload, decoder=DECODER_JS)
+
+
+def has_display():
+    # Notebooks always render inline; elsewhere only a desktop session can open a browser.
+    # Set PLOTLY_HEADLESS=1 to never show figures (report runs, CI).
+    if os.environ.get("PLOTLY_HEADLESS"):
+        return False
+    if "ipykernel" in sys.modules:
+        return True
+    if sys.platform.startswith("linux"):
+        return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+    return True
+
+
+class FigureExporter:
+    # Writes Plotly figures as HTML and static images. Kaleido starts its renderer
+    # on the first image and keeps it running, so every image written by one
+    # exporter (one process) pays the startup cost once. In batch mode figures are
+    # queued and written together when the batch ends. In shared mode HTML pages
+    # load plotly.js from one shared asset instead of embedding it, and the size of
+    # every such page is recorded for payload_report (standalone pages embed the
+    # whole bundle, so a byte budget says nothing about them).
+    def __init__(self, formats=FORMATS, show=None, shared=False, asset=SHARED_ASSET):
+        self.formats = tuple(formats)
+        self.show = has_display() if show is None else show
+        self.shared = shared
+        self.asset = asset
+        self.batching = False
+        self.pending = []
+        self.sizes = {}
+
+    def save(self, fig, path):
+        # path has no extension; one file is written per format
+        if self.batching:
+            self.pending.append((fig, path))
+        else:
+            self._write(fig, path)
+        if self.show:
+            fig.show()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for fig, path in pending:
+            self._write(fig, path)
+
+    def _write(self, fig, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for fmt in self.formats:
+            target = f"{path}.{fmt}"
+            if fmt == "html" and self.shared:
+                self._write_asset()
+                script = os.path.relpath(self.asset, os.path.dirname(target)).replace(os.sep, "/")
+                with open(target, "w", encoding="utf-8") as file:
+                    file.write(shared_page(fig, script))
+                self.sizes[target] = os.path.getsize(target)
+            elif fmt == "html":
+                fig.write_html(target)
+            elif fmt == "json":
+                fig.write_json(target)
+            else:
+                pio.write_image(fig, target, format=fmt, engine="kaleido")
+
+    def _write_asset(self):
+        if not os.path.exists(self.asset):
+            os.makedirs(os.path.dirname(self.asset) or ".", exist_ok=True)
+            with open(self.asset, "w", encoding="utf-8") as file:
+                file.write(plotly.offline.get_plotlyjs())
+
+
+def payload_report(sizes, budget=PAYLOAD_BUDGET):
+    # One line per HTML page: its size and whether it fits the budget
+    width = max(map(len, sizes), default=4)
+    lines = [f"{'Page':<{width}} {'Bytes':>10}  Budget {budget:,}"]
+    for path, size in sorted(sizes.items()):
+        status = "ok" if size <= budget else f"OVER by {size - budget:,}"
+        lines.append(f"{path:<{width}} {size:>10,}  {status}")
+    over = sum(size > budget for size in sizes.values())
+    lines.append(f"{len(sizes)} pages, {sum(sizes.values()):,} bytes, {over} over budget")
+    return "\n".join(lines)
+
+
+# Exporter used by the interactive chart scripts
+exporter = FigureExporter()
+
+
+def save_figure(fig, path):
+    exporter.save(fig, path)
+
+
+@contextmanager
+def batch_export(formats=None, show=None, shared=None):
+    # Queue every figure saved inside the block and write them all at the end,
+    # optionally with other formats (e.g. ("html", "png", "svg")), show setting
+    # or HTML mode
+    previous = (exporter.formats, exporter.show, exporter.shared, exporter.batching)
+    if formats is not None:
+        exporter.formats = tuple(formats)
+    if show is not None:
+        exporter.show = show
+    if shared is not None:
+        exporter.shared = shared
+    exporter.batching = True
+    try:
+        yield exporter
+        exporter.flush()
+    finally:
+        exporter.formats, exporter.show, exporter.shared, exporter.batching = previous
+        exporter.pending = []
+
+
+# Interactive chart scripts whose figures are exported together
+INTERACTIVE_SCRIPTS = [
+    "cabinet.cabinet_visuals_interactive",
+    "expenseCategory.expenseCategory_interactive_visuals",
+    "program.budget_by_program_interactive",
+    "models.price_predicatability",
+]
+
+
+def export_all(formats=None, shared=None, budget=PAYLOAD_BUDGET, modules=INTERACTIVE_SCRIPTS):
+    # Build the interactive figures of the chart scripts and write them in one
+    # headless session, then report the size of each shared-asset HTML page
+    # against the budget
+    import importlib
+
+    with batch_export(formats=formats, show=False, shared=shared) as batch:
+        batch.sizes = {}
+        for module in modules:
+            importlib.import_module(module).main()
+        count = len(batch.pending)
+    if exporter.sizes:
+        print(payload_report(exporter.sizes, budget))
+    return count
+
+
+def export_script(module):
+    # One chart script's figures in one batch (one warm Kaleido renderer per report
+    # task, while the tasks of different scripts run in parallel)
+    return export_all(modules=[module])
+
+
+def benchmark():
+    # Figures per second: each script in its own process (how they were run
+    # before) against one batch session for all of them
+    env = dict(os.environ, PLOTLY_HEADLESS="1")
+
+    start = time.perf_counter()
+    for module in INTERACTIVE_SCRIPTS:
+        subprocess.run([sys.executable, "-m", module], check=True, env=env, stderr=subprocess.DEVNULL)
+    separate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", "from common.plotly_export import export_all; print(export_all())"],
+        check=True, env=env, stderr=subprocess.DEVNULL, stdout=subprocess.PIPE, text=True
+    )
+    batch_time = time.perf_counter() - start
+    figures = int(output.stdout.split()[-1])
+
+    print(f"Figures: {figures}")
+    print(f"One process per script: {separate_time:.2f}s ({figures / separate_time:.2f} figures/s)")
+    print(f"Batch session:          {batch_time:.2f}s ({figures / batch_time:.2f} figures/s)")
+
+
+def test_compact_figure_json():
+    import plotly.graph_objects as go
+
+    years = np.arange(2000, 2022)
+    amounts = np.linspace(0.5, 1e6, len(years))
+    fig = go.Figure(go.Scatter(x=years, y=amounts, text=[str(year) for year in years], name="</script>"))
+    figure = json.loads(compact_figure_json(fig))
+    trace = figure["data"][0]
+
+    # Whole numbers become exact deltas, other numbers float32; strings stay as they are
+    assert trace["x"] == {"__delta__": [2000] + [1] * (len(years) - 1)}
+    decoded = np.frombuffer(base64.b64decode(trace["y"]["__f4__"]), dtype="<f4")
+    assert np.allclose(decoded, amounts, rtol=1e-6)
+    assert trace["text"][0] == "2000"
+    assert encode_array([1.5, 2.5]) is None and encode_array([True] * 10) is None
+
+    # The payload cannot close its script tag early
+    page = shared_page(fig, "../assets/plotly.min.js")
+    assert page.count("</script>") == 3
+    assert '<script src="../assets/plotly.min.js">' in page
+
+
+
+def test_payload_sizes(tmp_path):
+    import plotly.graph_objects as go
+
+    # Only shared-asset pages are measured against the budget; standalone pages
+    # carry the whole plotly.js bundle
+    fig = go.Figure(go.Scatter(x=[1, 2], y=[3, 4]))
+    standalone = FigureExporter(formats=("html",), show=False)
+    standalone.save(fig, str(tmp_path / "standalone"))
+    assert (tmp_path / "standalone.html").exists() and standalone.sizes == {}
+
+    asset = str(tmp_path / "assets" / "plotly.min.js")
+    shared = FigureExporter(formats=("html",), show=False, shared=True, asset=asset)
+    shared.save(fig, str(tmp_path / "pages" / "shared"))
+    assert list(shared.sizes) == [str(tmp_path / "pages" / "shared.html")]
+    assert "0 over budget" in payload_report(shared.sizes)
+
+
+if __name__ == "__main__":
+    # The chart scripts save through common.plotly_export's exporter, not the one of
+    # this __main__ module, so the batch has to run there
+    from common import plotly_export
+
+    if "--benchmark" in sys.argv:
+        plotly_export.benchmark()
+    else:
+        budget = int(sys.argv[sys.argv.index("--budget") + 1]) if "--budget" in sys.argv else PAYLOAD_BUDGET
+        count = plotly_export.export_all(shared="--shared" in sys.argv, budget=budget)
+        print(f"Exported {count} figures")
@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# Budget hierarchy, from the broadest level to the finest
+HIERARCHY = ['Cabinet', 'Dept', 'Program', 'Expense Category']
+
+# FY money columns of the operating budget
+MONEY_COLS = ['FY22 Actual Expense', 'FY23 Actual Expense',
+              'FY24 Appropriation', 'FY25 Budget']
+
+# Money is stored as whole cents, so sums are exact integer additions. Columns
+# are plain int64; only a column that actually has missing amounts is the
+# nullable Int64 (a mask next to the values, and slower arithmetic), so that
+# missing amounts stay missing.
+CENTS_DTYPE = 'int64'
+NULLABLE_CENTS_DTYPE = 'Int64'
+
+
+def to_cents(values):
+    # Dollar amounts (floats or numeric strings, NaN for missing) as int64 cents,
+    # nullable Int64 cents if any amount is missing
+    dollars = pd.to_numeric(values, errors='coerce')
+    cents = pd.Series(np.round(dollars * 100), index=getattr(values, 'index', None))
+    return cents.astype(NULLABLE_CENTS_DTYPE if cents.isna().any() else CENTS_DTYPE)
+
+
+def is_cents(column):
+    # Whether a money column holds cents (either cents dtype); money in dollars is
+    # always float, so an integer money column is cents
+    return str(column.dtype) in (CENTS_DTYPE, NULLABLE_CENTS_DTYPE)
+
+
+def drop_missing(df, money_cols=MONEY_COLS):
+    # Rows that have every one of the money columns, which are then plain int64 cents
+    complete = df.dropna(subset=money_cols)
+    return complete.astype({col: CENTS_DTYPE for col in money_cols if is_cents(complete[col])})
+
+
+def to_dollars(data, money_cols=MONEY_COLS):
+    # Cents back to float dollars (NaN for missing). A frame is returned with its
+    # money columns converted and its hierarchy columns decoded to plain strings,
+    # ready for plotting libraries that expect ordinary columns.
+    if isinstance(data, pd.Series):
+        return data.astype('float64') / 100
+
+    data = data.copy()
+    for col in data.columns:
+        if col in money_cols:
+            data[col] = data[col].astype('float64') / 100
+        elif isinstance(data[col].dtype, pd.CategoricalDtype):
+            data[col] = data[col].astype(object)
+    return data
+
+
+def build_code_dictionary(df, columns=HIERARCHY):
+    # One code per distinct name in each column, assigned in sorted name order, so the
+    # same names always get the same codes (whatever the row order) and sorting by
+    # code sorts by name
+    return {col: sorted(df[col].dropna().unique()) for col in columns}
+
+
+def apply_schema(df, dictionary=None, money_cols=MONEY_COLS):
+    # Hierarchy columns as categoricals over the code dictionary and money columns
+    # as int64 cents; other columns are left as they are
+    dictionary = dictionary or build_code_dictionary(df, [col for col in HIERARCHY if col in df])
+    typed = df.copy()
+    for col, names in dictionary.items():
+        typed[col] = pd.Categorical(df[col], categories=names)
+    for col in money_cols:
+        if col in typed:
+            typed[col] = to_cents(df[col])
+    return typed
+
+
+def code_dictionary(df):
+    # The code dictionary a typed frame was built with
+    return {col: list(df[col].cat.categories) for col in df.columns
+            if isinstance(df[col].dtype, pd.CategoricalDtype)}
+
+
+def sum_by(df, by, cols):
+    # Money totals per group of a typed frame, grouped on the category codes
+    # (only groups that occur, sorted by name) and summed exactly in cents.
+    # Returns float dollars indexed by plain names, like a groupby on strings.
+    grouped = df.groupby(by, observed=True, sort=True)[cols].sum()
+    if isinstance(grouped.index, pd.MultiIndex):
+        grouped.index = grouped.index.set_levels([level.astype(object) for level in grouped.index.levels])
+    else:
+        grouped.index = grouped.index.astype(object)
+    return grouped.astype('float64') / 100
+
+
+def memory_report(raw, typed):
+    # Memory of each column before and after the schema, and the total saving
+    raw_usage = raw.memory_usage(deep=True, index=False)
+    typed_usage = typed.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        'before': raw_usage,
+        'after': typed_usage,
+        'dtype': typed.dtypes.astype(str),
+    })
+    report['saved'] = 1 - report['after'] / report['before']
+    total_before, total_after = raw_usage.sum(), typed_usage.sum()
+
+    lines = [f"{col:<22} {row['dtype']:<9} {row['before'] / 1e3:10.1f} KB -> {row['after'] / 1e3:8.1f} KB "
+             f"({row['saved']:6.1%} saved)" for col, row in report.iterrows()]
+    lines.append(f"{'Total':<22} {'':<9} {total_before / 1e3:10.1f} KB -> {total_after / 1e3:8.1f} KB "
+                 f"({1 - total_after / total_before:6.1%} saved)")
+    return "\n".join(lines)
+
+
+def test_schema():
+    raw = pd.DataFrame({
+        'Cabinet': ['B', 'A', 'B', None],
+        'FY24 Appropriation': [1.5, 2, 0, 3],
+        'FY25 Budget': ['1.10', '#Missing', '2.205', '0.1'],
+    })
+    typed = apply_schema(raw)
+
+    # Codes follow sorted names; missing names and amounts stay missing, and only
+    # the money column with missing amounts is nullable
+    assert code_dictionary(typed) == {'Cabinet': ['A', 'B']}
+    assert typed['Cabinet'].cat.codes.tolist() == [1, 0, 1, -1]
+    assert str(typed['FY24 Appropriation'].dtype) == CENTS_DTYPE
+    assert str(typed['FY25 Budget'].dtype) == NULLABLE_CENTS_DTYPE
+    assert typed['FY25 Budget'].isna().tolist() == [False, True, False, False]
+    complete = drop_missing(typed, ['FY24 Appropriation', 'FY25 Budget'])
+    assert complete['FY25 Budget'].tolist() == [110, 220, 10] and str(complete['FY25 Budget'].dtype) == CENTS_DTYPE
+
+    # Cents sum exactly and come back as dollars, indexed by plain names
+    totals = sum_by(typed, 'Cabinet', 'FY25 Budget')
+    assert totals.to_dict() == {'A': 0.0, 'B': 3.3}
+    assert totals.index.dtype == object
+
+
+if __name__ == "__main__":
+    from common.loaders import OPERATING_BUDGET_PATH, load_csv, load_operating_budget
+
+    # Previous representation (object strings, float64 dollars) against the typed schema
+    print(memory_report(load_csv(OPERATING_BUDGET_PATH, MONEY_COLS), load_operating_budget(OPERATING_BUDGET_PATH)))
@@ -1,20 +1,19 @@
-import pandas as pd
 import plotly.express as px
 import os
+from common.loaders import load_operating_budget
+from common.schema import sum_by
+from common.plotly_export import save_figure
 
 # Ensure the output directory exists
 output_dir = './expenseCategory/visualizations/'
 os.makedirs(output_dir, exist_ok=True)
 
 def generate_visualization(path):
-    # Load the data
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
-    df = df.replace('#Missing', pd.NA).apply(pd.to_numeric, errors='ignore')
+    # Load the data (names are categories, amounts int64 cents; sum_by returns dollars)
+    df = load_operating_budget(path)
 
     # Aggregate FY25 budget by expense category
-    fy25_budget = df.groupby('Expense Category')['FY25 Budget'].sum()
+    fy25_budget = sum_by(df, 'Expense Category', 'FY25 Budget')
 
     # Sort the categories by their FY25 budget in descending order
     fy25_budget = fy25_budget.sort_values(ascending=False)
@@ -33,28 +32,19 @@ def generate_visualization(path):
         hole=0.4  # Optional for a donut chart
     )
 
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir, 'fy25_budget_by_expenseCategory_PieChart_interactive.html'))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, 'fy25_budget_by_expenseCategory_PieChart_interactive.png'))
-
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, 'fy25_budget_by_expenseCategory_PieChart_interactive'))
 
 def generate_changes(path):
     # Load data
-    df = pd.read_csv(path)
+    df = load_operating_budget(path)
     spending_cols = ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']
 
-    # Ensure columns are numeric
-    for col in spending_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-
     # Drop rows with missing values in spending columns
     df.dropna(subset=spending_cols, inplace=True)
 
     # Aggregate total spending over time by expense category
-    spending_over_time = df.groupby('Expense Category')[spending_cols].sum().reset_index()
+    spending_over_time = sum_by(df, 'Expense Category', spending_cols).reset_index()
 
     # Reshape data for line plot (spending over time by category)
     spending_over_time = spending_over_time.melt(
@@ -75,13 +65,8 @@ def generate_changes(path):
     fig.update_yaxes(title='Amount ($)', tickformat=',')
     fig.update_xaxes(title='Year')
 
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir, 'expenseCategory_spending_over_time_interactive.html'))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, 'expenseCategory_spending_over_time_interactive.png'))
-
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, 'expenseCategory_spending_over_time_interactive'))
 
 def main():
     # Provide the path to the CSV file
@@ -89,4 +74,5 @@ def main():
     generate_visualization(path)
     generate_changes(path)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,182 @@
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import imageio
+import matplotlib
+import numpy as np
+from geographic.neighborhoods import add_neighborhood_labels, label_layer
+from geographic.tracts import load_tracts
+
+# Maps are written here, one PNG per (feature, color scheme) panel
+OUTPUT_DIR = "./geographical-plots"
+
+# Color schemes of the panels; None is matplotlib's default colormap
+COLOR_SCHEMES = ["OrRd", None]
+
+# Shading of tracts with no value
+MISSING_KWDS = {
+    "color": "lightgrey",
+    "edgecolor": "red",
+    "hatch": "///",
+    "label": "Missing values",
+}
+
+# Frame size of animated maps in inches and dots per inch (every frame the same)
+FRAME_SIZE = 8
+FRAME_DPI = 80
+
+# Frame and tracts of the worker process, set once by _init_worker
+_frame = None
+_labels = None
+
+
+def _init_worker(frame, labels):
+    # Workers draw off-screen with Agg and receive the map data once, not per panel
+    global _frame, _labels
+    matplotlib.use("Agg", force=True)
+    _frame, _labels = frame, labels
+
+
+def feature_title(feature):
+    # "IllnessPerCapita" -> "Illness Per Capita"
+    return ''.join([' ' + char if char.isupper() else char for char in feature]).strip()
+
+
+def map_features(frame):
+    # Every column of a tract frame that can be mapped
+    return [col for col in frame.columns if col not in ('Name', 'Shape__Are', 'Shape__Len', 'geometry')]
+
+
+def panel_path(output_dir, feature, cmap, cmaps):
+    # The first scheme's panel is <feature>.png, the others <feature>-<scheme>.png
+    suffix = "" if cmap == cmaps[0] else f"-{cmap or 'default'}"
+    return os.path.join(output_dir, f"{feature}{suffix}.png")
+
+
+def draw_map(feature, cmap, figsize, font_sz=5):
+    # One labelled choropleth of the worker's frame on a new Agg figure
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(figsize, figsize))
+    _frame.plot(
+        ax=ax,
+        column=feature,
+        cmap=cmap,
+        legend=True,
+        scheme="quantiles",
+        edgecolor='k',
+        missing_kwds=MISSING_KWDS,
+    )
+    add_neighborhood_labels(ax, _labels, font_sz=font_sz)
+    ax.set_title(feature_title(feature), fontsize=16, weight='bold')
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_frame_on(False)
+    return fig
+
+
+def render_panel(feature, cmap, path, dpi=300):
+    # Draw and write one panel; returns its path and render time
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig = draw_map(feature, cmap, 14)
+    fig.savefig(path, bbox_inches="tight", dpi=dpi)
+    plt.close(fig)
+    return path, time.perf_counter() - start
+
+
+def render_frame(feature, cmap):
+    # One animation frame as an RGB array of a fixed size
+    import matplotlib.pyplot as plt
+
+    fig = draw_map(feature, cmap, FRAME_SIZE)
+    fig.set_dpi(FRAME_DPI)
+    fig.canvas.draw()
+    frame = np.asarray(fig.canvas.buffer_rgba())[:, :, :3].copy()
+    plt.close(fig)
+    return frame
+
+
+def _ordered(pool, fn, tasks, window):
+    # Results of fn(*task) in task order, with at most `window` tasks in flight, so
+    # finished results do not pile up while an earlier one is still running
+    pending = deque()
+    for task in tasks:
+        pending.append(pool.submit(fn, *task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def render_maps(frame, features, output_dir=OUTPUT_DIR, cmaps=COLOR_SCHEMES, jobs=None, dpi=300, labels=None):
+    # Every (feature, scheme) panel drawn and written by a pool of Agg workers
+    labels = label_layer() if labels is None else labels
+    os.makedirs(output_dir, exist_ok=True)
+    tasks = [(feature, cmap, panel_path(output_dir, feature, cmap, cmaps), dpi)
+             for feature in features for cmap in cmaps]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(frame, labels)) as pool:
+        results = list(pool.map(render_panel, *zip(*tasks)))
+    print(f"Rendered {len(results)} maps to {output_dir} in {time.perf_counter() - start:.1f}s "
+          f"(sum of render times: {sum(seconds for _, seconds in results):.1f}s)")
+    return [path for path, _ in results]
+
+
+def animate_features(frame, features, path, cmap="OrRd", seconds_per_frame=1.0, jobs=None, labels=None):
+    # Animated GIF cycling through the features. Frames are drawn in parallel and
+    # streamed into the GIF writer in order; only a few frames are held at a time.
+    labels = label_layer() if labels is None else labels
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    window = 2 * (jobs or os.cpu_count() or 1)
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(frame, labels)) as pool, \
+            imageio.get_writer(path, format="GIF-PIL", mode="I", duration=seconds_per_frame, loop=0) as writer:
+        for image in _ordered(pool, render_frame, [(feature, cmap) for feature in features], window):
+            writer.append_data(image)
+    return path
+
+
+def test_render_maps(tmp_path):
+    tracts = load_tracts()
+    features = ["IllnessPerCapita", "VacantRatio"]
+
+    paths = render_maps(tracts, features, str(tmp_path), cmaps=["OrRd", None], jobs=2, dpi=30)
+    assert [os.path.basename(path) for path in paths] == [
+        "IllnessPerCapita.png", "IllnessPerCapita-default.png", "VacantRatio.png", "VacantRatio-default.png"]
+    assert all(os.path.getsize(path) > 0 for path in paths)
+
+    gif = animate_features(tracts, features, str(tmp_path / "features.gif"), jobs=2)
+    frames = imageio.mimread(gif)
+    assert len(frames) == 2 and frames[0].shape[:2] == (FRAME_SIZE * FRAME_DPI, FRAME_SIZE * FRAME_DPI)
+
+
+def benchmark(jobs=None, dpi=100):
+    # Serial drawing in one process (as the notebook did) against the worker pool
+    import tempfile
+
+    tracts = load_tracts()
+    features = map_features(tracts)
+    with tempfile.TemporaryDirectory() as output_dir:
+        _init_worker(tracts, label_layer())
+        start = time.perf_counter()
+        for feature in features:
+            for cmap in COLOR_SCHEMES:
+                render_panel(feature, cmap, panel_path(output_dir, feature, cmap, COLOR_SCHEMES), dpi)
+        print(f"Serial: {len(features) * len(COLOR_SCHEMES)} maps in {time.perf_counter() - start:.1f}s")
+        render_maps(tracts, features, output_dir, jobs=jobs, dpi=dpi)
+
+
+if __name__ == "__main__":
+    jobs = int(sys.argv[sys.argv.index("-j") + 1]) if "-j" in sys.argv else None
+    if "--benchmark" in sys.argv:
+        benchmark(jobs)
+    else:
+        tracts = load_tracts()
+        features = map_features(tracts)
+        render_maps(tracts, features, jobs=jobs)
+        animate_features(tracts, features, os.path.join(OUTPUT_DIR, "features.gif"), jobs=jobs)
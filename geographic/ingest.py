@@ -0,0 +1,176 @@
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# Boston Opportunity Agenda childcare affordability table, one row per ZIP-code
+# neighborhood ("Allston/Brighton" rows cover several tract neighborhoods)
+CHILDCARE_PATH = './data/geographic-data/childcare-affordability-data.csv'
+
+# Readable names for the childcare columns (source names with spaces stripped)
+CHILDCARE_COLUMNS = {
+    'WhitePer': 'WhitePct',
+    'BlackPer': 'BlackPct',
+    'LatinxPer': 'LatinxPct',
+    'AsianPer': 'AsianPct',
+    'MarFam': 'MarriedFamiliesPct',
+    'MalFam': 'MaleHouseholdsPct',
+    'FemFam': 'FemaleHouseholdsPct',
+    'PovPer': 'PovertyPct',
+    'InfCarAfford': 'NotAffordInfantCare',
+    'PreCareAfford': 'NotAffordPrecare',
+    'InfCostCareMedInc': 'InfantCareToMedianIncomeRatio',
+    'PreCostCareMedInc': 'PrecareMedianIncomeRatio',
+}
+
+# Childcare neighborhood names under the tract layer's name for the same area
+CHILDCARE_NAMES = {
+    'Beacon Hill': 'North End',
+    'Central Boston': 'Leather District',
+    'Kenmore': 'Fenway',
+}
+
+CHILDCARE_COUNTS = ['PopBto5', 'Pop0to2', 'Pop3to5', 'ParentLabFor']
+CHILDCARE_PERCENTS = list(CHILDCARE_COLUMNS.values())
+CHILDCARE_CURRENCY = ['MedianIncome']
+
+
+def split_names(data, column, separator='/'):
+    # One row per name of a combined "Allston/Brighton" entry, each with the
+    # combined row's values
+    names = data[column].str.split(separator)
+    exploded = data.assign(**{column: names}).explode(column, ignore_index=True)
+    exploded[column] = exploded[column].str.strip()
+    return exploded
+
+
+def canonical_names(names, lookup):
+    # Names found in the lookup table replaced by their canonical form
+    return names.map(lookup).fillna(names)
+
+
+def parse_numbers(data, strip):
+    # Numeric strings of every column at once, with the characters matched by the
+    # `strip` pattern removed ("41%", "$75,777", "1,092"); numbers pass through and
+    # anything else becomes NaN
+    text = data.astype(str).replace(strip, '', regex=True)
+    return text.apply(pd.to_numeric, errors='coerce')
+
+
+def parse_percents(data):
+    # Percent strings ("41%") as fractions; numbers, including numeric columns,
+    # are already fractions and pass through unchanged. Only the percent sign is
+    # stripped: "1,5 %" is not a percent and becomes NaN
+    values = parse_numbers(data, r'[%\s]')
+    is_percent = data.astype(str).apply(lambda column: column.str.contains('%', regex=False))
+    return values.mask(is_percent, values / 100)
+
+
+def parse_currency(data):
+    return parse_numbers(data, r'[$,\s]')
+
+
+def parse_counts(data):
+    return parse_numbers(data, r'[,\s]')
+
+
+def load_neighborhood_table(path, name_col, columns=None, names=None, counts=(), percents=(), currency=(),
+                            separator='/'):
+    # Neighborhood table ready to merge onto the tracts by name: blank rows and
+    # columns dropped, column names stripped and renamed, combined names split into
+    # one row each and canonicalized (keeping the first row of a repeated name), and
+    # count, percent (as fractions) and currency columns parsed to numbers
+    data = pd.read_csv(path, dtype=str).dropna(how='all').dropna(axis=1, how='all')
+    data.columns = data.columns.str.strip()
+    data = data.rename(columns=columns or {})
+
+    data = split_names(data, name_col, separator)
+    if names:
+        data[name_col] = canonical_names(data[name_col], names)
+    data = data.drop_duplicates(subset=name_col, keep='first', ignore_index=True)
+
+    for cols, parse in ((counts, parse_counts), (percents, parse_percents), (currency, parse_currency)):
+        if cols:
+            data[list(cols)] = parse(data[list(cols)])
+    return data
+
+
+def load_childcare(path=CHILDCARE_PATH):
+    return load_neighborhood_table(path, 'Neighborhoods', CHILDCARE_COLUMNS, CHILDCARE_NAMES,
+                                   CHILDCARE_COUNTS, CHILDCARE_PERCENTS, CHILDCARE_CURRENCY)
+
+
+def _legacy_childcare(path=CHILDCARE_PATH):
+    # Previous notebook steps: iterrows split and per-cell lambdas
+    data = pd.read_csv(path)
+    data.dropna(how='all', inplace=True)
+    data.drop(columns="Unnamed: 18", inplace=True)
+    rows = []
+    for _, row in data.iterrows():
+        for name in str(row["Neighborhoods"]).split("/"):
+            new_row = row.copy()
+            new_row["Neighborhoods"] = name
+            rows.append(new_row)
+    data = pd.DataFrame(rows)
+    data["Neighborhoods"] = data["Neighborhoods"].apply(lambda x: CHILDCARE_NAMES[x] if x in CHILDCARE_NAMES else x)
+    data.columns = data.columns.str.strip()
+    data = data.rename(columns=CHILDCARE_COLUMNS)
+    for col in CHILDCARE_PERCENTS:
+        data[col] = data[col].apply(lambda x: float(x.strip('%')) / 100 if pd.notna(x) and type(x) == str else x)
+    data['MedianIncome'] = data['MedianIncome'].apply(
+        lambda x: float(''.join(x.strip('$').split(','))) if pd.notna(x) and type(x) == str else x)
+    return data
+
+
+def benchmark(copies=200):
+    # The childcare table repeated `copies` times with every name suffixed by its
+    # copy number, through the previous steps and the vectorized loader
+    data = pd.read_csv(CHILDCARE_PATH, dtype=str).dropna(how='all')
+    scaled = pd.concat([data.assign(Neighborhoods=data['Neighborhoods'].str.replace('/', f' {i}/') + f' {i}')
+                        for i in range(copies)])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'childcare.csv')
+        scaled.to_csv(path, index=False)
+        for name, load in (("iterrows and lambdas", _legacy_childcare), ("vectorized", load_childcare)):
+            start = time.perf_counter()
+            rows = len(load(path))
+            print(f"{name:<22} {rows:,} rows in {time.perf_counter() - start:.3f}s")
+
+
+def test_load_childcare():
+    childcare = load_childcare()
+    legacy = _legacy_childcare()
+
+    # Combined names become one row each, under the tract layer's names
+    names = childcare['Neighborhoods'].tolist()
+    assert {'Allston', 'Brighton', 'Back Bay', 'North End', 'Leather District'} <= set(names)
+    assert len(names) == len(set(names)) == len(legacy) - 1      # "Fenway/Kenmore" -> Fenway once
+
+    # Same values as the per-cell parsing, and the counts are numbers too
+    merged = childcare.merge(legacy.drop_duplicates('Neighborhoods'), on='Neighborhoods', suffixes=('', '_legacy'))
+    for col in CHILDCARE_PERCENTS + CHILDCARE_CURRENCY:
+        assert np.allclose(merged[col], merged[f'{col}_legacy'].astype(float), equal_nan=True)
+    allston = childcare.set_index('Neighborhoods').loc['Allston']
+    assert allston['PopBto5'] == 2619 and allston['WhitePct'] == 0.41 and allston['MedianIncome'] == 75777
+
+
+def test_parsers():
+    data = pd.DataFrame({'a': ['41%', ' 1,5 %', None, 0.5], 'b': ['$75,777', '$0', 'n/a', 12]})
+    assert parse_percents(data[['a']])['a'].tolist()[0] == 0.41
+    assert parse_percents(data[['a']])['a'].isna().tolist() == [False, True, True, False]
+    assert parse_percents(data[['a']])['a'][3] == 0.5
+    fractions = pd.DataFrame({'a': [0.41, 0.05]})
+    pd.testing.assert_frame_equal(parse_percents(fractions), fractions)
+    assert parse_currency(data[['b']])['b'].tolist()[:2] == [75777, 0]
+    assert np.isnan(parse_currency(data[['b']])['b'][2])
+    assert parse_currency(data[['b']])['b'][3] == 12
+    assert canonical_names(pd.Series(['Kenmore', 'Roxbury']), CHILDCARE_NAMES).tolist() == ['Fenway', 'Roxbury']
+
+
+if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        print(load_childcare().to_string())
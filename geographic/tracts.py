@@ -0,0 +1,207 @@
+import hashlib
+import os
+import time
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from common.loaders import CACHE_DIR, file_hash
+
+# Census tracts of the Climate Ready Boston vulnerability data
+CLIMATE_READY_PATH = './data/geographic-data/climate-ready/c7230a7a-4081-4743-b911-e18f66e1beca2020330-1-17gw6be.a4ds.shp'
+
+# 2020 census counts per neighborhood, merged onto the tracts by Name
+NEIGHBORHOOD_DATA_PATH = './data/geographic-data/boston-neighborhood-data-2020.csv'
+
+# Files making up a shapefile besides the .shp itself
+SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# Bump when the cleaning or the derived columns change, so old caches are not reused
+LAYER_VERSION = 1
+
+# Source columns that are not used, and readable names for the attributes
+DROPPED_COLUMNS = ['FID', 'GEOID10', 'AREA_SQFT']
+RENAMER = {
+    'AREA_ACRES': 'AreaAcres',
+    'POP100_RE': 'PopulationCount',
+    'HU100_RE': 'HousingUnitCount',
+    'TotDis': 'PeopleWithDisabilities',
+    'TotChild': 'ChildrenUnder5',
+    'OlderAdult': 'OlderAdults',
+    'Low_to_No': 'LowIncomeHouseholds',
+    'LEP': 'LowEnglishProficiency',
+    'POC2': 'PeopleOfColor',
+    'MedIllnes': 'MedicalIllnessCount',
+}
+
+# Neighborhood data columns kept, by their names in the census file
+NEIGHBORHOOD_COLUMNS = {
+    'field concept': 'Name',
+    'Total:': 'Total',
+    'White alone': 'WhiteAl',
+    'Black or African American alone': 'BlackAl',
+    'Hispanic or Latino': 'Latino',
+    'Asian, Native Hawaiian and Pacific Islander alone, all ages': 'AsianAl',
+    'Other Races or Multiple Races,  all ages': 'Mixed',
+    'Institutionalized population:': 'InstitutionalizedPop',
+    'Correctional facilities for adults': 'CorrectionalFacilitiesAdult',
+    'Juvenile facilities': 'CorrectionalFacilitiesJuvenile',
+    'Nursing facilities/Skilled-nursing facilities': 'NursingFacilities',
+    'College/University student housing': 'UnivHousing',
+    'Military quarters': 'MilitaryQuarters',
+    'Occupied': 'Occupied',
+    'Vacant': 'Vacant',
+    'household size': 'HouseholdSize',
+}
+
+# Census neighborhoods that are part of a tract neighborhood of another name
+NEIGHBORHOOD_NAMES = {
+    'Beacon Hill': 'North End',
+    'Chinatown': 'Leather District',
+    'Longwood': 'Mission Hill',
+    'Downtown': 'Leather District',
+}
+
+# Square miles per acre
+SQUARE_MILES_PER_ACRE = 0.0015625
+
+# Cleaned tract layers already loaded by this process, keyed by the cache path
+_loaded = {}
+
+
+def load_climate_ready(path=CLIMATE_READY_PATH):
+    tracts = gpd.read_file(path)
+    return tracts.drop(columns=DROPPED_COLUMNS).rename(columns=RENAMER)
+
+
+def load_neighborhood_data(path=NEIGHBORHOOD_DATA_PATH):
+    # One row per tract neighborhood: census neighborhoods that map to the same
+    # name are added together (household size is averaged)
+    data = pd.read_csv(path, header=1, usecols=list(NEIGHBORHOOD_COLUMNS)).rename(columns=NEIGHBORHOOD_COLUMNS)
+    data['Name'] = data['Name'].replace(NEIGHBORHOOD_NAMES)
+    aggregations = {col: 'sum' for col in data.columns if col not in ('Name', 'HouseholdSize')}
+    aggregations['HouseholdSize'] = 'mean'
+    return data.groupby('Name', sort=True).agg(aggregations).reset_index()
+
+
+def add_derived_rates(tracts):
+    # Rates derived from the tract and neighborhood counts, as whole-column operations
+    tracts['PopulationDensity'] = tracts['PopulationCount'] / (tracts['AreaAcres'] * SQUARE_MILES_PER_ACRE)
+    tracts['IllnessPerCapita'] = tracts['MedicalIllnessCount'] / tracts['PopulationCount']
+    tracts['VacantRatio'] = tracts['Vacant'] / (tracts['Vacant'] + tracts['Occupied'])
+    tracts['LowEnglishProficiencyRate'] = tracts['LowEnglishProficiency'] / tracts['PopulationCount']
+    tracts['TotalCorrectionalFacilities'] = tracts['CorrectionalFacilitiesAdult'] + tracts['CorrectionalFacilitiesJuvenile']
+    tracts['DisabledRate'] = tracts['PeopleWithDisabilities'] / tracts['PopulationCount']
+    tracts['OlderAdultPct'] = tracts['OlderAdults'] / tracts['PopulationCount']
+    tracts['HousesPerCapita'] = tracts['HousingUnitCount'] / tracts['PopulationCount']
+    return tracts
+
+
+def build_tracts(path=CLIMATE_READY_PATH, neighborhood_path=NEIGHBORHOOD_DATA_PATH):
+    # Cleaned tracts with the neighborhood counts merged on and the derived rates
+    tracts = load_climate_ready(path).merge(load_neighborhood_data(neighborhood_path), how='left', on='Name')
+    return add_derived_rates(tracts)
+
+
+def tracts_cache_path(path=CLIMATE_READY_PATH, neighborhood_path=NEIGHBORHOOD_DATA_PATH):
+    # GeoParquet file for the current contents of every source file
+    stem = os.path.splitext(path)[0]
+    sources = [stem + part for part in SHAPEFILE_PARTS if os.path.exists(stem + part)] + [neighborhood_path]
+    key = hashlib.sha256(repr((LAYER_VERSION, [file_hash(source) for source in sources])).encode()).hexdigest()
+    return os.path.join(CACHE_DIR, f"climate-ready-tracts-{key[:16]}.parquet")
+
+
+def _load(path, neighborhood_path):
+    cache_path = tracts_cache_path(path, neighborhood_path)
+    if cache_path not in _loaded:
+        if os.path.exists(cache_path):
+            tracts = gpd.read_parquet(cache_path)
+        else:
+            tracts = build_tracts(path, neighborhood_path)
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tracts.to_parquet(cache_path, index=False)
+        # Spatial index over the tract outlines, built once with the layer
+        _loaded[cache_path] = (tracts, shapely.STRtree(tracts.geometry.values))
+    return _loaded[cache_path]
+
+
+def load_tracts(path=CLIMATE_READY_PATH, neighborhood_path=NEIGHBORHOOD_DATA_PATH):
+    # Cleaned and enriched tracts, read from the GeoParquet cache (built on first
+    # use and rebuilt when a source file changes); each caller gets its own copy
+    tracts, _ = _load(path, neighborhood_path)
+    return tracts.copy()
+
+
+def tracts_at(points, path=CLIMATE_READY_PATH, neighborhood_path=NEIGHBORHOOD_DATA_PATH):
+    # Position in the tract layer of the tract containing each point (-1 outside
+    # every tract), looked up through the prebuilt STRtree; points are shapely
+    # geometries or (x, y) pairs in the layer's CRS (EPSG:3857)
+    _, tree = _load(path, neighborhood_path)
+    points = np.asarray(points)
+    if points.dtype != object:
+        points = shapely.points(points.astype(float))
+    point_idx, tract_idx = tree.query(points, predicate='within')
+    # Matches come sorted by point; a point in more than one tract keeps the first
+    matched, first = np.unique(point_idx, return_index=True)
+    result = np.full(len(points), -1)
+    result[matched] = tract_idx[first]
+    return result
+
+
+def neighborhoods_at(points, path=CLIMATE_READY_PATH, neighborhood_path=NEIGHBORHOOD_DATA_PATH):
+    # Neighborhood name of each point (None outside Boston)
+    tracts, _ = _load(path, neighborhood_path)
+    positions = tracts_at(points, path, neighborhood_path)
+    names = tracts['Name'].to_numpy()[np.maximum(positions, 0)].astype(object)
+    names[positions < 0] = None
+    return names
+
+
+def benchmark():
+    # Time to a ready layer: shapefile parse, cleaning, merge and rates (before)
+    # against reading the GeoParquet cache
+    start = time.perf_counter()
+    build_tracts()
+    build_time = time.perf_counter() - start
+
+    _loaded.clear()
+    load_tracts()
+    _loaded.clear()
+    start = time.perf_counter()
+    load_tracts()
+    cached_time = time.perf_counter() - start
+
+    tracts = load_tracts()
+    points = tracts.geometry.representative_point()
+    start = time.perf_counter()
+    tracts_at(points)
+    lookup_time = time.perf_counter() - start
+    print(f"Shapefile + cleaning: {build_time * 1000:.1f}ms, GeoParquet cache: {cached_time * 1000:.1f}ms, "
+          f"{len(points)} indexed point lookups: {lookup_time * 1000:.2f}ms")
+
+
+def test_load_tracts():
+    tracts = load_tracts()
+    built = build_tracts()
+
+    # The cached layer is the built one, and the tracts are not duplicated by the
+    # neighborhood merge
+    pd.testing.assert_frame_equal(pd.DataFrame(tracts.drop(columns='geometry')),
+                                  pd.DataFrame(built.drop(columns='geometry')))
+    assert list(tracts.columns) == list(built.columns)
+    assert tracts.geometry.geom_equals(built.geometry).all()
+    assert len(tracts) == len(load_climate_ready())
+    assert tracts.crs == built.crs == gpd.read_parquet(tracts_cache_path()).crs
+    assert np.allclose(tracts['IllnessPerCapita'], tracts['MedicalIllnessCount'] / tracts['PopulationCount'],
+                       equal_nan=True)
+
+    # Each tract's representative point is found in that tract; far away points in none
+    points = tracts.geometry.representative_point()
+    assert (tracts_at(points) == np.arange(len(tracts))).all()
+    assert (neighborhoods_at(points) == tracts['Name'].to_numpy()).all()
+    assert tracts_at([(0.0, 0.0)]).tolist() == [-1]
+    assert neighborhoods_at([(0.0, 0.0)]).tolist() == [None]
+
+
+if __name__ == "__main__":
+    benchmark()
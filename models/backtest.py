@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from models.estimators import DEFAULT_BACKEND, make_estimator, make_pipeline
+from models.forecaster import backtest_origins, forecast_series, preprocess_data
+from models.lag_features import SERIES_KEYS
+from models.pipeline import FeaturePipeline, ForecastModel
+
+# Backtest results are written here
+OUTPUT_DIR = "models/artifacts"
+
+
+def run_fold(features, pipeline, origin, horizon, backend=DEFAULT_BACKEND, params=None):
+    # Fit on every row up to the origin year and forecast the next `horizon` years
+    # recursively (each year's lags come from the previous predictions), exactly as
+    # the production forecast does; returns the forecasts next to the actuals
+    train = features[features["Year"] <= origin]
+    start = time.perf_counter()
+    estimator = make_estimator(backend, pipeline.feature_columns, params)
+    estimator.fit(train[pipeline.feature_columns], train["Budget"])
+    fit_time = time.perf_counter() - start
+
+    model = ForecastModel(pipeline, estimator)
+    forecast = forecast_series(train, model, origin + 1, origin + horizon, pipeline.lags)
+    actual = features.loc[(features["Year"] > origin) & (features["Year"] <= origin + horizon),
+                          SERIES_KEYS + ["Year", "Budget"]]
+    fold = forecast[SERIES_KEYS + ["Year", "Predicted"]].merge(actual, on=SERIES_KEYS + ["Year"])
+    fold.insert(2, "origin", origin)
+    fold.insert(3, "horizon", fold["Year"] - origin)
+    return fold, fit_time
+
+
+def backtest(data, origins=None, folds=5, horizon=3, lags=2, jobs=None, backend=DEFAULT_BACKEND, params=None):
+    # Rolling-origin backtest: one model per origin year, trained only on the years
+    # up to it and scored on the years after it. Lag features are built once for the
+    # whole history and sliced per fold (a row's lags only look back in time, so the
+    # slice equals recomputing them on the truncated data), and folds run in
+    # parallel on a process pool. params (e.g. tuned ones) override the estimator
+    # defaults. Returns one row per forecast point.
+    pipeline = make_pipeline(backend, lags)
+    features = pipeline.fit_transform(data)
+    origins = backtest_origins(features["Year"], folds) if origins is None else list(origins)
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(run_fold, features[features["Year"] <= origin + horizon], pipeline, origin, horizon, backend,
+                        params)
+            for origin in origins
+        ]
+        results = [future.result() for future in futures]
+    wall_time = time.perf_counter() - start
+
+    fit_time = sum(fit for _, fit in results)
+    print(f"Backtested {len(origins)} origins ({origins[0]}-{origins[-1]}), horizon {horizon}, "
+          f"in {wall_time:.2f}s (sum of fit times: {fit_time:.2f}s)")
+    return pd.concat([fold for fold, _ in results], ignore_index=True)
+
+
+def horizon_errors(forecasts, by=SERIES_KEYS):
+    # Error by forecast horizon (years after the origin), per group of `by`
+    # (e.g. City and Variable, or [] for all series together), over all origins
+    errors = forecasts.assign(
+        error=forecasts["Predicted"] - forecasts["Budget"],
+        abs_error=(forecasts["Predicted"] - forecasts["Budget"]).abs(),
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        errors["ape"] = np.where(errors["Budget"] != 0, errors["abs_error"] / errors["Budget"].abs(), np.nan)
+    errors["squared_error"] = errors["error"] ** 2
+
+    summary = errors.groupby(list(by) + ["horizon"], sort=True).agg(
+        folds=("origin", "nunique"),
+        mse=("squared_error", "mean"),
+        mae=("abs_error", "mean"),
+        bias=("error", "mean"),
+        mape=("ape", "mean"),
+    )
+    return summary.reset_index()
+
+
+def export_backtest(path="data/MajorMetroCityBudgets.csv", output_dir=OUTPUT_DIR, folds=5, horizon=3, jobs=None):
+    data = preprocess_data(pd.read_csv(path))
+    forecasts = backtest(data, folds=folds, horizon=horizon, jobs=jobs)
+
+    os.makedirs(output_dir, exist_ok=True)
+    horizon_errors(forecasts).to_csv(os.path.join(output_dir, "backtest_by_series.csv"), index=False)
+    overall = horizon_errors(forecasts, by=[])
+    overall.to_csv(os.path.join(output_dir, "backtest_by_horizon.csv"), index=False)
+    return overall
+
+
+def test_backtest():
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    last_year = int(data["Year"].max())
+    forecasts = backtest(data, origins=[last_year - 3, last_year - 1], horizon=2, jobs=2)
+
+    # Every series is forecast for every year after each origin, up to the last year
+    n_series = data.groupby(SERIES_KEYS).ngroups
+    assert len(forecasts) == n_series * (2 + 1)
+    assert (forecasts["Year"] > forecasts["origin"]).all()
+    assert forecasts["horizon"].between(1, 2).all()
+
+    # Sliced lag features match lags recomputed on the truncated history
+    pipeline = FeaturePipeline()
+    features = pipeline.fit_transform(data)
+    truncated = pipeline.transform(data[data["Year"] <= last_year - 3])
+    sliced = features[features["Year"] <= last_year - 3]
+    pd.testing.assert_frame_equal(sliced.reset_index(drop=True), truncated)
+
+    summary = horizon_errors(forecasts)
+    assert set(summary["horizon"]) == {1, 2}
+    assert len(horizon_errors(forecasts, by=[])) == 2
+
+
+if __name__ == "__main__":
+    jobs = int(sys.argv[sys.argv.index("-j") + 1]) if "-j" in sys.argv else None
+    print(export_backtest(jobs=jobs).to_string(index=False))
@@ -1,34 +1,21 @@
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.metrics import mean_squared_error
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from sklearn.preprocessing import OneHotEncoder
-
-# Step 1: Clean the data so it can be used 
-def preprocess_data(data):
-    # Melt the wide-format DataFrame into long format for easier analysis
-    data_long = data.melt(id_vars=["Variable", "Year"], 
-                          var_name="City", 
-                          value_name="Budget")
-    
-    # Remove commas from the Budget column and convert to numeric
-    data_long["Budget"] = data_long["Budget"].replace(",", "", regex=True).astype(float)
-    
-    # Handle missing values by forward-filling or interpolation
-    data_long["Budget"] = data_long["Budget"].fillna(method="ffill")
-    data_long["Budget"] = data_long["Budget"].fillna(method="bfill")
-    data_long.dropna(inplace=True)
-    
-    # Ensure Year is numeric for time-series modeling
-    data_long["Year"] = pd.to_numeric(data_long["Year"])
-    
-    return data_long
+from models.estimators import DEFAULT_BACKEND, make_pipeline
+from models.forecaster import (fit_and_score_gbm, generate_future_predictions, load_or_train_forecaster,
+                               predict_history, prepare_data_for_gbm_category, preprocess_data, refit_gbm,
+                               time_split)
+from models.intervals import load_or_train_interval_forecaster
+from models.pipeline import ForecastModel
+from models.tuning import load_best_params
 
 # Step 2: Interactive Graph to Filter City Trends
 def interactive_city_trends(data):
@@ -54,183 +41,118 @@ def interactive_city_trends(data):
     
     fig.show()
 
-# Step 3 and 7: Prepare Data for Gradient Boosting Model
-def prepare_data_for_gbm_all(data):
-    # Create lag features for all cities
-    
-    data = data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
- 
-    data["Lag1"] = data["Budget"].shift(1)
-    data["Lag2"] = data["Budget"].shift(2)
-    
-    # Apply the condition to set Lag1 and Lag2 to NaN based on index
-    data["Lag1"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag1"], axis=1)
-    data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag2"], axis=1)
-    data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 1 else row["Lag2"], axis=1)
-    
-    data.dropna(inplace=True)
-    
-    # Apply one-hot encoding to the 'Variable' column
-    encoder = OneHotEncoder(sparse_output=False)
-    variable_encoded = encoder.fit_transform(data[["Variable"]])
-
-    # Convert encoded array to a DataFrame with appropriate column names
-    encoded_df = pd.DataFrame(variable_encoded, columns=encoder.get_feature_names_out(["Variable"]))
-
-    # Concatenate with existing lag features
-    data = pd.concat([data.reset_index(drop=True), encoded_df.reset_index(drop=True)], axis=1)
-    
-    # Split into features and target
-    X = data.drop(columns=["Budget", "Variable", "City"])
-    y = data["Budget"]
-    
-    # Train-test split (we will train on the entire dataset and predict on the same)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    return X_train, X_test, y_train, y_test
-
-def prepare_data_for_gbm_category(data, category):
-    # Filter for Boston city only
-    boston_data = data[data["City"] == category].copy()  # Explicitly create a copy
-    
-    boston_data = boston_data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
-    
-    # Create lag features for Boston data
-    boston_data["Lag1"] = boston_data["Budget"].shift(1)
-    boston_data["Lag2"] = boston_data["Budget"].shift(2)
-    
-    # Apply the condition to set Lag1 and Lag2 to NaN based on index
-    boston_data["Lag1"] = boston_data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag1"], axis=1)
-    boston_data["Lag2"] = boston_data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag2"], axis=1)
-    boston_data["Lag2"] = boston_data.apply(lambda row: 0 if (row.name) % 22 == 1 else row["Lag2"], axis=1)
-    
-    boston_data.dropna(inplace=True)
-    
-    # Apply one-hot encoding to the 'Variable' column
-    encoder = OneHotEncoder(sparse_output=False)
-    variable_encoded = encoder.fit_transform(boston_data[["Variable"]])
-
-    # Convert encoded array to a DataFrame with appropriate column names
-    encoded_df = pd.DataFrame(variable_encoded, columns=encoder.get_feature_names_out(["Variable"]))
-
-    # Concatenate with existing lag features
-    boston_data = pd.concat([boston_data.reset_index(drop=True), encoded_df.reset_index(drop=True)], axis=1)
-    
-    # Split into features and target
-    X_boston = boston_data.drop(columns=["Budget", "Variable", "City"])
-    y_boston = boston_data["Budget"]
-    
-    # Train-test split for Boston
-    X_train, X_test, y_train, y_test = train_test_split(X_boston, y_boston, test_size=0.2, random_state=42)
-    
-    return X_train, X_test, y_train, y_test
-
-# Step 5: Train Gradient Boosting Model
-# Important: The predictions from this model should be used to predict the budget for Boston MA in 2025. 
-# This data is in a separate file and the comparison between machine predictions and actual data will be informative
-def train_gbm(X_train, X_test, y_train, y_test):
-    # Initialize and train the model
-    model = GradientBoostingRegressor(random_state=42)
-    model.fit(X_train, y_train)
-    
-    # Make predictions and evaluate
-    y_pred = model.predict(X_test)
-    mse = mean_squared_error(y_test, y_pred)
-    print(f"MSE:{mse}")
-    
-    return model
+# Train one model on a single group's rows, scored on its latest years (runs in a worker process)
+def train_group_model(key, group_data, lags=2, backend=DEFAULT_BACKEND):
+    pipeline = make_pipeline(backend, lags)
+    features = pipeline.fit_transform(group_data)
+    split = time_split(features, pipeline.feature_columns)
+    _, mse, fit_time = fit_and_score_gbm(*split, backend=backend)
+    estimator = refit_gbm(*split, backend=backend)
+    return key, ForecastModel(pipeline, estimator), {"rows": len(features), "mse": mse, "fit_time": fit_time}
+
+# Train one GBM per city (by="City") or per city and variable (by=["City", "Variable"]),
+# spreading the models over a process pool; returns the models and a leaderboard
+# of test MSE and fit time, best model first
+def train_group_models(data, by="City", jobs=None, lags=2, backend=DEFAULT_BACKEND):
+    by = [by] if isinstance(by, str) else list(by)
+    groups = data.groupby(by, sort=True)
+
+    models = {}
+    rows = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(train_group_model, key, group_data, lags, backend) for key, group_data in groups]
+        for future in futures:
+            key, model, scores = future.result()
+            key = key if isinstance(key, tuple) else (key,)
+            models[key if len(key) > 1 else key[0]] = model
+            rows.append({**dict(zip(by, key)), **scores})
+    wall_time = time.perf_counter() - start
+
+    leaderboard = pd.DataFrame(rows).sort_values("mse", ignore_index=True)
+    leaderboard.insert(0, "rank", np.arange(1, len(leaderboard) + 1))
+    print(f"Trained {len(models)} models in {wall_time:.2f}s (sum of fit times: {leaderboard['fit_time'].sum():.2f}s)")
+    return models, leaderboard
+
+# Per-city (or per city and variable) leaderboard, written next to the trained models
+def export_leaderboard(by="City", jobs=None, output_dir="models/artifacts"):
+    data = preprocess_data(pd.read_csv('data/MajorMetroCityBudgets.csv'))
+    _, leaderboard = train_group_models(data, by, jobs)
+
+    name = "leaderboard_" + "_".join(col.lower() for col in ([by] if isinstance(by, str) else by))
+    os.makedirs(output_dir, exist_ok=True)
+    leaderboard.to_csv(os.path.join(output_dir, f"{name}.csv"), index=False)
+    return leaderboard
 
 # Step 6: Visualize the changes and the model
-def visualize_predictions_interactive(data, model):
-    # Ensure data includes predictions for all cities
-    data = data.copy()
-    
-    data = data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
- 
-    data["Lag1"] = data["Budget"].shift(1)
-    data["Lag2"] = data["Budget"].shift(2)
-    
-    # Apply the condition to set Lag1 and Lag2 to NaN based on index
-    data["Lag1"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag1"], axis=1)
-    data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag2"], axis=1)
-    data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 1 else row["Lag2"], axis=1)
-    
-    data.dropna(inplace=True)
-    
-    encoder = OneHotEncoder(sparse_output=False)
-    
-    # One-hot encode the 'Variable' column
-    categorical_encoded = encoder.fit_transform(data["Variable"].values.reshape(-1,1))
-    
-    encoded_df = pd.DataFrame(categorical_encoded, columns=encoder.get_feature_names_out(['Variable']))
-    data = pd.concat([data.reset_index(drop=True), encoded_df.reset_index(drop=True)], axis=1)
-    data["Predicted"] = model.predict(data.drop(columns=["Budget", "City", "Variable"]))
-    data.loc[(data["Lag1"] == 0) & (data["Lag2"] == 0), "Predicted"] = 0
-
-    # Initialize lists for city buttons, variable buttons
-    unique_cities = data["City"].unique()
-    unique_variables = data["Variable"].unique()
-
-    # Create a subplot with 2 rows and 3 columns (6 cities)
+# Most points drawn per trace; longer series are decimated evenly (first and last kept)
+MAX_POINTS = 500
+
+# Subplot columns of the predictions figure (one subplot per city)
+SUBPLOT_COLS = 3
+
+# Evenly spaced positions of at most max_points out of n, always keeping the ends
+def decimate(n, max_points=MAX_POINTS):
+    if n <= max_points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, max_points).round().astype(int))
+
+# Traces split from one sort of the rows by (variable, city, year): an actual and a
+# predicted trace per series, placed on its city's subplot. Dropdown visibility is
+# built from each trace's integer variable code, so names that contain each other
+# ("Spending" and "Total Spending") never match the wrong button.
+def build_predictions_figure(predictions, max_points=MAX_POINTS):
+    variable_codes, variables = pd.factorize(predictions["Variable"])
+    city_codes, cities = pd.factorize(predictions["City"])
+    years = predictions["Year"].to_numpy().astype(int)
+    budget = predictions["Budget"].to_numpy(dtype=float).round(2)
+    predicted = predictions["Predicted"].to_numpy(dtype=float).round(2)
+
+    order = np.lexsort((years, city_codes, variable_codes))
+    series = variable_codes[order] * len(cities) + city_codes[order]
+    bounds = np.flatnonzero(np.diff(series)) + 1
+
+    rows = -(-len(cities) // SUBPLOT_COLS)
     fig = make_subplots(
-        rows=2, cols=3,
-        subplot_titles=[f"City {city}" for city in unique_cities],
+        rows=rows, cols=SUBPLOT_COLS,
+        subplot_titles=[f"City {city}" for city in cities],
         shared_xaxes=True, shared_yaxes=True
     )
 
-    # Variable to store the trace references
     traces = []
-
-    # Create traces for each (city, variable) combination
-    for variable in unique_variables:
-        for city_idx, city in enumerate(unique_cities):
-            filtered_data = data[(data["City"] == city) & (data["Variable"] == variable)]
-
-            # Add actual and predicted traces to the figure
-            row = city_idx // 3 + 1
-            col = city_idx % 3 + 1
-
-            actual_trace = go.Scatter(
-                x=filtered_data["Year"],
-                y=filtered_data["Budget"],
+    trace_variables = []
+    for positions in np.split(order, bounds):
+        positions = positions[decimate(len(positions), max_points)]
+        variable, city = variable_codes[positions[0]], city_codes[positions[0]]
+        axis = "" if city == 0 else str(city + 1)
+        for kind, values in (("Actual", budget), ("Predicted", predicted)):
+            traces.append(go.Scatter(
+                x=years[positions],
+                y=values[positions],
                 mode="lines",
-                name=f"Actual - {variable} ({city})",
-                showlegend=True  # Ensure legend is shown
-            )
-            predicted_trace = go.Scatter(
-                x=filtered_data["Year"],
-                y=filtered_data["Predicted"],
-                mode="lines",
-                name=f"Predicted - {variable} ({city})",
-                showlegend=True  # Ensure legend is shown
-            )
-
-            fig.add_trace(actual_trace, row=row, col=col)
-            fig.add_trace(predicted_trace, row=row, col=col)
-
-            # Store traces for later reference in the dropdown
-            traces.append((actual_trace, predicted_trace))
-
-    # Create dropdown buttons for variable selection
-    variable_buttons = []
-    for variable in unique_variables:
-        visibility = [False] * len(fig.data)
-        for i, (actual_trace, predicted_trace) in enumerate(traces):
-            if variable in actual_trace.name:
-                visibility[2*i] = True  # Show the actual trace for this variable
-            if variable in predicted_trace.name:
-                visibility[2*i+1] = True  # Show the predicted trace for this variable
-
-        variable_buttons.append(
-            dict(
-                label=variable,
-                method="update",
-                args=[
-                    {"visible": visibility},
-                    {"title": f"Actual vs Predicted Budgets for {variable}"}
-                ]
-            )
+                name=f"{kind} - {variables[variable]} ({cities[city]})",
+                xaxis=f"x{axis}",
+                yaxis=f"y{axis}",
+            ))
+            trace_variables.append(variable)
+    fig.add_traces(traces)
+
+    # One button per variable; the first variable is shown when the figure opens
+    trace_variables = np.array(trace_variables)
+    masks = [trace_variables == code for code in range(len(variables))]
+    for trace, visible in zip(fig.data, masks[0]):
+        trace.visible = bool(visible)
+    variable_buttons = [
+        dict(
+            label=variable,
+            method="update",
+            args=[
+                {"visible": mask.tolist()},
+                {"title": f"Actual vs Predicted Budgets for {variable}"}
+            ]
         )
+        for variable, mask in zip(variables, masks)
+    ]
 
     # Create a layout with dropdown buttons for variable selection
     fig.update_layout(
@@ -244,11 +166,10 @@ def visualize_predictions_interactive(data, model):
                 "xanchor": "left",
             }
         ],
-        title="Actual vs Predicted Budgets",
+        title=f"Actual vs Predicted Budgets for {variables[0]}",
         xaxis_title="Year",
         yaxis_title="Budget",
-        height=800,  # Increase height to accommodate legend at the bottom
-        grid=dict(rows=2, columns=3, pattern="independent"),  # 2x3 grid layout
+        height=400 * max(rows, 2),  # Increase height to accommodate legend at the bottom
         legend=dict(
             orientation="h",  # Horizontal layout
             yanchor="bottom",  # Place legend at the bottom
@@ -257,84 +178,71 @@ def visualize_predictions_interactive(data, model):
             x=0.5,  # Center the legend horizontally
         ),
     )
+    return fig
+
+def visualize_predictions_interactive(data, model):
+    fig = build_predictions_figure(predict_history(data, model))
 
     # Show the figure
     fig.show()
 
-# Step 8: Generate predictions on the future
-def generate_future_predictions(data, model, category, start_year=2022, end_year=2022):
-    # Filter for the given city/category
-    city_data = data[data["City"] == category].copy()
-    
-    city_data = city_data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
- 
-    city_data["Lag1"] = city_data["Budget"].shift(1)
-    city_data["Lag2"] = city_data["Budget"].shift(2)
-    
-    # Apply the condition to set Lag1 and Lag2 to NaN based on index
-    city_data["Lag1"] = city_data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag1"], axis=1)
-    city_data["Lag2"] = city_data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag2"], axis=1)
-    city_data["Lag2"] = city_data.apply(lambda row: 0 if (row.name) % 22 == 1 else row["Lag2"], axis=1)
-    
-    city_data.dropna(inplace=True)
-    
-    encoder = OneHotEncoder(sparse_output=False)
-    
-    # One-hot encode the 'Variable' column
-    categorical_encoded = encoder.fit_transform(city_data["Variable"].values.reshape(-1,1))
-    
-    encoded_df = pd.DataFrame(categorical_encoded, columns=encoder.get_feature_names_out(['Variable']))
-    
-    city_data = pd.concat([city_data.reset_index(drop=True), encoded_df.reset_index(drop=True)], axis=1)
-    
-    city_data["Predicted"] = model.predict(city_data.drop(columns=["Budget", "City", "Variable"]))
-    city_data.loc[(city_data["Lag1"] == 0) & (city_data["Lag2"] == 0), "Predicted"] = 0
-    
-    city_data.dropna(inplace=True)
-    future_data = []
-    previous_prediction = 0
-    previous_previous_predicition = 0
-    for i in range(city_data.shape[0] // 22):
-        for year in range(start_year, end_year + 1):      
-            # Generate future predictions
-            future_row = {}
-            future_row["Variable"] = city_data.loc[i*22+1]["Variable"]
-            future_row["Year"] = year
-            future_row["City"] = category            
-            future_row["Budget"] = None
-            # Calculate the lags for the future data
-            if year-start_year == 0:
-                future_row["Lag1"] = city_data.loc[(i+1)*22+ year - start_year - 1]["Budget"]
-                future_row["Lag2"] = city_data.loc[(i+1)*22 + year - start_year - 2]["Budget"]
-            elif year-start_year == 1:
-                future_row["Lag1"] = previous_prediction
-                future_row["Lag2"] = city_data.loc[(i+1)*22 + year - start_year-2]["Budget"]
-            else:
-                future_row["Lag1"] = previous_prediction
-                future_row["Lag2"] = previous_previous_predicition
-
-            for col in city_data.columns:
-                if col.startswith("Variable_"):
-                    future_row[col] = city_data.loc[i*22 + 1, col]
-            
-            prediction = model.predict(pd.DataFrame([[future_row["Year"], future_row["Lag1"], future_row["Lag2"]] + \
-            [future_row[col] for col in future_row if col.startswith("Variable_")]], columns=["Year", "Lag1", "Lag2"] + \
-            [col for col in future_row if col.startswith("Variable_")]))[0]
-            future_row["Predicted"] = prediction
-                
-            previous_previous_predicition = previous_prediction
-            previous_prediction = prediction
-            if future_row["Lag1"] == 0 and future_row["Lag2"] == 0:
-                future_row["Predicted"] = 0
-            # Append the future row to the future data list
-            future_data.append(future_row)
-        
-    future_data = pd.DataFrame(future_data)
+# Previous builder (a boolean mask per (variable, city) pair and substring
+# visibility matching), kept for the benchmark; six cities at most
+def _legacy_predictions_figure(data):
+    unique_cities = data["City"].unique()
+    unique_variables = data["Variable"].unique()
+    fig = make_subplots(
+        rows=2, cols=3,
+        subplot_titles=[f"City {city}" for city in unique_cities],
+        shared_xaxes=True, shared_yaxes=True
+    )
+    traces = []
+    for variable in unique_variables:
+        for city_idx, city in enumerate(unique_cities):
+            filtered_data = data[(data["City"] == city) & (data["Variable"] == variable)]
+            row = city_idx // 3 + 1
+            col = city_idx % 3 + 1
+            actual_trace = go.Scatter(x=filtered_data["Year"], y=filtered_data["Budget"], mode="lines",
+                                      name=f"Actual - {variable} ({city})", showlegend=True)
+            predicted_trace = go.Scatter(x=filtered_data["Year"], y=filtered_data["Predicted"], mode="lines",
+                                         name=f"Predicted - {variable} ({city})", showlegend=True)
+            fig.add_trace(actual_trace, row=row, col=col)
+            fig.add_trace(predicted_trace, row=row, col=col)
+            traces.append((actual_trace, predicted_trace))
 
-    # Concatenate the historical data with the predicted future data
-    complete_data = pd.concat([city_data, future_data], ignore_index=True)
-    complete_data = complete_data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
-    return complete_data
+    variable_buttons = []
+    for variable in unique_variables:
+        visibility = [False] * len(fig.data)
+        for i, (actual_trace, predicted_trace) in enumerate(traces):
+            if variable in actual_trace.name:
+                visibility[2*i] = True
+            if variable in predicted_trace.name:
+                visibility[2*i+1] = True
+        variable_buttons.append(dict(label=variable, method="update", args=[
+            {"visible": visibility}, {"title": f"Actual vs Predicted Budgets for {variable}"}]))
+    fig.update_layout(updatemenus=[{"buttons": variable_buttons, "direction": "down", "showactive": True,
+                                    "x": .32, "y": 1.15, "xanchor": "left"}],
+                      title="Actual vs Predicted Budgets", height=800)
+    return fig
+
+# Build time and JSON size of the predictions figure, previous builder against the
+# current one, on the metro table with `variables` renamed copies of every variable
+def benchmark_figure(variables=10):
+    from models.estimators import scale_panel
+
+    data = preprocess_data(pd.read_csv('data/MajorMetroCityBudgets.csv'))
+    predictions = predict_history(data, load_or_train_forecaster(data))
+    predictions = scale_panel(predictions, cities=1, variables=variables)
+    predictions["City"] = predictions["City"].str.removesuffix(" #0")
+    n_series = predictions.groupby(["City", "Variable"]).ngroups
+    print(f"{n_series} series, {len(predictions):,} points")
+    print(f"{'Builder':<10} {'build':>9} {'JSON':>10}")
+    for name, build in (("previous", _legacy_predictions_figure), ("current", build_predictions_figure)):
+        start = time.perf_counter()
+        fig = build(predictions)
+        build_time = time.perf_counter() - start
+        size = len(fig.to_json(pretty=False))
+        print(f"{name:<10} {build_time:>8.2f}s {size / 1e6:>8.2f}MB")
 
 """def merge_outside_data(data):
     outside_source = pd.read_csv("data/fy25-adopted-operating-budget.csv")
@@ -385,14 +293,17 @@ def generate_future_predictions(data, model, category, start_year=2022, end_year
     return data"""
 
 # Step 9: Graph the future predictions
-def visualize_boston_predictions(complete_data):
+def build_boston_predictions_figure(complete_data):
     
     # Define the unique variables in the data
     unique_variables = complete_data["Variable"].unique().tolist()
     unique_variables.append("All Variables")  # Add "All Variables" as an option
     
-    # Create traces for actual and predicted values
+    # Create traces for actual and predicted values, recording the variable of
+    # every trace as it is added
     traces = []
+    trace_variables = []
+    band_columns = [col for col in complete_data.columns if col.startswith("P") and col[1:].isdigit()]
     
     for variable in unique_variables:
         if variable == "All Variables":
@@ -420,15 +331,21 @@ def visualize_boston_predictions(complete_data):
                     name=f"Predicted - {variable}",
                 )
             )
+
+            # Add the forecast band when the model is calibrated
+            if band_columns:
+                traces.extend(band_traces(filtered_data, variable, band_columns))
+            trace_variables.extend([variable] * (len(traces) - len(trace_variables)))
     
     # Create dropdown buttons for variables
+    trace_variables = np.array(trace_variables, dtype=object)
     variable_buttons = []
     for variable in unique_variables:
         visibility = [True] * len(traces)  # Show all traces initially
         
-        # Filter the traces to show only for the selected variable
+        # Show only the traces added for the selected variable
         if variable != "All Variables":
-            visibility = [False if ( (str(variable)) not in (str(trace.name))) else True for trace in traces]
+            visibility = (trace_variables == variable).tolist()
         
         variable_buttons.append(
             dict(
@@ -455,9 +372,24 @@ def visualize_boston_predictions(complete_data):
         xaxis_title="Year",
         yaxis_title="Budget",
     )
+    return fig
+
+def visualize_boston_predictions(complete_data):
+    fig = build_boston_predictions_figure(complete_data)
     
     fig.show()
 
+# Shaded band between the outermost forecast quantiles of one variable
+def band_traces(filtered_data, variable, columns):
+    future = filtered_data.dropna(subset=columns)
+    lower, upper = columns[0], columns[-1]
+    return [
+        go.Scatter(x=future["Year"], y=future[upper], mode="lines", line=dict(width=0),
+                   name=f"{upper} - {variable}", showlegend=False),
+        go.Scatter(x=future["Year"], y=future[lower], mode="lines", line=dict(width=0),
+                   fill="tonexty", name=f"{lower}-{upper} - {variable}"),
+    ]
+
 def main_workflow():
     # Load the data
     data = pd.read_csv('data/MajorMetroCityBudgets.csv')
@@ -468,11 +400,10 @@ def main_workflow():
     # Step 2: Interactive graph for city trends
     interactive_city_trends(data)
     
-    # Step 3: Prepare data for gradient boosting model (Train on all cities)
-    X_train, X_test, y_train, y_test = prepare_data_for_gbm_all(data)
-    
-    # Step 4: Train the gradient boosting model
-    gbm_model_all = train_gbm(X_train, X_test, y_train, y_test)
+    # Step 3 and 4: Prepare data and train the gradient boosting model on all cities
+    # (loaded from models/artifacts when the data has not changed), with the
+    # hyperparameters found by models.tuning if it was run
+    gbm_model_all = load_or_train_forecaster(data, params=load_best_params())
     
     # Step 5: Visualize predictions interactively for all cities
     visualize_predictions_interactive(data, gbm_model_all)
@@ -480,11 +411,9 @@ def main_workflow():
     # Select a city (e.g., Boston MA) for analysis and prediction
     category = "MA: Boston"
     
-    # Step 6: Prepare data for gradient boosting model (Train only on Boston)
-    X_train, X_test, y_train, y_test = prepare_data_for_gbm_category(data, category)
-    
-    # Step 7: Train the gradient boosting model for Boston
-    gbm_model_boston = train_gbm(X_train, X_test, y_train, y_test)
+    # Step 6 and 7: Prepare data and train the gradient boosting model for Boston,
+    # calibrated on a backtest for P10/P50/P90 bands
+    gbm_model_boston = load_or_train_interval_forecaster(data, category, params=load_best_params(category))
     
     # Step 8: Generate future predictions for Boston (2021-2030)
     complete_data = generate_future_predictions(data, gbm_model_boston, category, start_year=2022, end_year=2025)
@@ -497,8 +426,92 @@ def main_workflow():
     visualize_boston_predictions(complete_data)
     return True
 
+# Train (or load) the pooled and the calibrated Boston forecasters without drawing any figures,
+# with the hyperparameters models.tuning saved for them, if any
+def train_models(category="MA: Boston"):
+    data = preprocess_data(pd.read_csv('data/MajorMetroCityBudgets.csv'))
+    load_or_train_forecaster(data, params=load_best_params())
+    load_or_train_interval_forecaster(data, category, params=load_best_params(category))
+
+# Write the Boston history plus future predictions (with P10/P50/P90 bands) to a CSV
+def export_future_predictions(path="models/model_examples/Example_Future_Boston_Output.csv",
+                              category="MA: Boston", start_year=2022, end_year=2025):
+    data = preprocess_data(pd.read_csv('data/MajorMetroCityBudgets.csv'))
+    model = load_or_train_interval_forecaster(data, category, params=load_best_params(category))
+    complete_data = generate_future_predictions(data, model, category, start_year, end_year)
+    complete_data.to_csv(path, index=False)
+
 if __name__ == "__main__":
-    assert main_workflow()
+    if "--benchmark-figure" in sys.argv:
+        benchmark_figure()
+    elif "--per-city" in sys.argv:
+        # One model per city (or per city and variable with --by-variable) on all cores
+        by = ["City", "Variable"] if "--by-variable" in sys.argv else "City"
+        print(export_leaderboard(by).to_string(index=False))
+    else:
+        assert main_workflow()
     
 def test():
-    assert main_workflow()
\ No newline at end of file
+    assert main_workflow()
+
+def test_group_models():
+    data = preprocess_data(pd.read_csv('data/MajorMetroCityBudgets.csv'))
+    models, leaderboard = train_group_models(data, jobs=2)
+
+    # One model per city, ranked by test MSE
+    assert sorted(models) == sorted(data["City"].unique())
+    assert leaderboard["mse"].is_monotonic_increasing
+    assert (leaderboard["fit_time"] > 0).all()
+
+    # The Boston model is the one the single-city path trains
+    boston = leaderboard.set_index("City").loc["MA: Boston"]
+    _, mse, _ = fit_and_score_gbm(*prepare_data_for_gbm_category(data, "MA: Boston"))
+    assert np.isclose(boston["mse"], mse)
+
+def test_predictions_figure():
+    # "Spending" is contained in "Total Spending"; the rows are deliberately unsorted
+    predictions = pd.DataFrame({
+        "Variable": ["Total Spending", "Spending", "Spending", "Total Spending", "Spending", "Spending"],
+        "City": ["A", "A", "B", "A", "A", "B"],
+        "Year": [2001.0, 2000.0, 2000.0, 2000.0, 2001.0, 2001.0],
+        "Budget": [2.0, 1.0, 5.0, 1.0, 3.0, 6.0],
+        "Predicted": [2.004, 1.0, 5.0, 1.0, 3.0, 6.0],
+    })
+    fig = build_predictions_figure(predictions)
+    buttons = {button.label: list(button.args[0]["visible"]) for button in fig.layout.updatemenus[0].buttons}
+
+    # Each button shows exactly its own variable's traces, matched by code not by name
+    assert buttons["Spending"] == [trace.name.split(" - ")[1].startswith("Spending") for trace in fig.data]
+    assert buttons["Total Spending"] == [not visible for visible in buttons["Spending"]]
+    assert [trace.visible for trace in fig.data] == buttons["Total Spending"]
+
+    # One actual and one predicted trace per series, in year order on its city's subplot
+    actual = {trace.name: trace for trace in fig.data if trace.name.startswith("Actual")}
+    assert list(actual["Actual - Spending (B)"].y) == [5.0, 6.0]
+    assert actual["Actual - Spending (B)"].xaxis == "x2"
+    assert list(fig.data[1].y) == [1.0, 2.0]
+
+    # Long series are decimated, keeping both ends
+    assert decimate(10, 4).tolist() == [0, 3, 6, 9]
+    assert decimate(3, 4).tolist() == [0, 1, 2]
+
+def test_boston_predictions_figure():
+    # "Spending" is contained in "Total Spending" and in both of its band trace names
+    complete_data = pd.DataFrame({
+        "Variable": ["Spending", "Spending", "Total Spending", "Total Spending"],
+        "Year": [2021.0, 2022.0, 2021.0, 2022.0],
+        "Budget": [1.0, np.nan, 2.0, np.nan],
+        "Predicted": [1.0, 1.1, 2.0, 2.2],
+        "P10": [np.nan, 1.0, np.nan, 2.0],
+        "P50": [np.nan, 1.1, np.nan, 2.2],
+        "P90": [np.nan, 1.2, np.nan, 2.4],
+    })
+    fig = build_boston_predictions_figure(complete_data)
+    buttons = {button.label: list(button.args[0]["visible"]) for button in fig.layout.updatemenus[0].buttons}
+
+    # Actual, predicted and the two band traces per variable; each button shows
+    # exactly the four traces added for its variable
+    assert len(fig.data) == 8
+    assert buttons["Spending"] == [True] * 4 + [False] * 4
+    assert buttons["Total Spending"] == [False] * 4 + [True] * 4
+    assert buttons["All Variables"] == [True] * 8
@@ -0,0 +1,119 @@
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from models.pipeline import CODE_SUFFIX, FeaturePipeline
+
+# An estimator backend for the budget forecaster: the feature encoding it expects
+# from FeaturePipeline and a function building the estimator for given feature
+# columns and hyperparameters
+Backend = namedtuple("Backend", ["encoding", "make"])
+
+
+def make_gbm(columns, params):
+    # Exact-split gradient boosting on one-hot encoded variables (the original model)
+    return GradientBoostingRegressor(random_state=42, **params)
+
+
+def make_hist_gbm(columns, params):
+    # Histogram-based gradient boosting: features are binned into at most 255 bins,
+    # so fitting scales with the number of bins rather than distinct values, and
+    # Variable and City are split on natively as categories
+    categorical = [col.endswith(CODE_SUFFIX) for col in columns]
+    return HistGradientBoostingRegressor(random_state=42, categorical_features=categorical, **params)
+
+
+BACKENDS = {
+    "gbm": Backend("onehot", make_gbm),
+    "hist_gbm": Backend("categorical", make_hist_gbm),
+}
+DEFAULT_BACKEND = "gbm"
+
+
+def get_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown estimator backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]
+
+
+def make_pipeline(backend=DEFAULT_BACKEND, lags=2):
+    # Feature pipeline with the encoding the backend expects
+    return FeaturePipeline(lags, encoding=get_backend(backend).encoding)
+
+
+def make_estimator(backend, columns, params=None):
+    return get_backend(backend).make(list(columns), params or {})
+
+
+def scale_panel(data, cities=25, variables=4, seed=0):
+    # A larger panel from the metro table: cities x variables copies of every series,
+    # as new cities ("MA: Boston #3") and new budget variables ("Total Revenue #2"),
+    # each copy rescaled by a random factor. The defaults give 100x the rows while
+    # keeping City within the 255 categories histogram boosting supports.
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(cities):
+        for j in range(variables):
+            frame = data.copy()
+            frame["City"] = frame["City"] + f" #{i}"
+            frame["Variable"] = frame["Variable"] + f" #{j}"
+            frame["Budget"] = frame["Budget"] * rng.uniform(0.5, 1.5)
+            frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def benchmark(data, backends=tuple(BACKENDS), folds=3, horizon=3, **scale):
+    # Fit time and predict time on the whole scaled panel, and backtest error by
+    # horizon, for each backend
+    from models.backtest import backtest, horizon_errors
+
+    panel = scale_panel(data, **scale)
+    print(f"Panel: {len(panel):,} rows ({len(panel) / len(data):.0f}x), "
+          f"{panel['City'].nunique()} cities, {panel['Variable'].nunique()} variables")
+
+    rows = []
+    for backend in backends:
+        pipeline = make_pipeline(backend)
+        features = pipeline.fit_transform(panel)
+        X, y = features[pipeline.feature_columns], features["Budget"]
+
+        estimator = make_estimator(backend, X.columns)
+        start = time.perf_counter()
+        estimator.fit(X, y)
+        fit_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        estimator.predict(X)
+        predict_time = time.perf_counter() - start
+
+        errors = horizon_errors(backtest(panel, folds=folds, horizon=horizon, backend=backend), by=[])
+        row = {"backend": backend, "features": X.shape[1], "fit_s": fit_time, "predict_s": predict_time}
+        row.update({f"mse_h{h}": mse for h, mse in zip(errors["horizon"], errors["mse"])})
+        rows.append(row)
+        print(row)
+
+    return pd.DataFrame(rows)
+
+
+def test_backends():
+    from models.forecaster import preprocess_data
+
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    for backend in BACKENDS:
+        pipeline = make_pipeline(backend)
+        features = pipeline.fit_transform(data)
+        estimator = make_estimator(backend, pipeline.feature_columns, {})
+        estimator.fit(features[pipeline.feature_columns], features["Budget"])
+        assert estimator.predict(features[pipeline.feature_columns]).shape == (len(features),)
+
+    # The categorical encoding keeps one integer code column per key instead of one-hot columns
+    pipeline = make_pipeline("hist_gbm").fit(data)
+    assert pipeline.encoded_columns == ["Variable_code", "City_code"]
+
+
+if __name__ == "__main__":
+    from models.forecaster import preprocess_data
+
+    results = benchmark(preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv")))
+    print(results.to_string(index=False))
@@ -0,0 +1,202 @@
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_squared_error
+from models.estimators import DEFAULT_BACKEND, make_estimator, make_pipeline
+from models.lag_features import lag_columns
+from models.pipeline import FeaturePipeline, ForecastModel, load_or_fit
+
+# Years held out (the latest ones) to score a freshly trained model
+HOLDOUT_YEARS = 3
+
+# Step 1: Clean the data so it can be used 
+def preprocess_data(data):
+    # Melt the wide-format DataFrame into long format for easier analysis
+    data_long = data.melt(id_vars=["Variable", "Year"], 
+                          var_name="City", 
+                          value_name="Budget")
+    
+    # Remove commas from the Budget column and convert to numeric
+    data_long["Budget"] = data_long["Budget"].replace(",", "", regex=True).astype(float)
+    
+    # Handle missing values by forward-filling or interpolation
+    data_long["Budget"] = data_long["Budget"].fillna(method="ffill")
+    data_long["Budget"] = data_long["Budget"].fillna(method="bfill")
+    data_long.dropna(inplace=True)
+    
+    # Ensure Year is numeric for time-series modeling
+    data_long["Year"] = pd.to_numeric(data_long["Year"])
+    
+    return data_long
+
+# The last `folds` years that still have at least one later year to forecast
+def backtest_origins(years, folds=5):
+    years = np.unique(years)
+    return [int(year) for year in years[:-1][-folds:]]
+
+# Time-ordered holdout: train on every year up to the first of the last
+# `holdout_years` backtest origins and test on the years after it, so the test
+# error never comes from a model that has seen later years
+def time_split(features, columns, holdout_years=HOLDOUT_YEARS):
+    origin = backtest_origins(features["Year"], holdout_years)[0]
+    train = (features["Year"] <= origin).to_numpy()
+    X, y = features[columns], features["Budget"]
+    return X[train], X[~train], y[train], y[~train]
+
+# Step 3 and 7: Prepare Data for Gradient Boosting Model
+def prepare_data_for_gbm_all(data, pipeline=None):
+    # Create lag features and one-hot encode 'Variable' (fits the pipeline's encoder)
+    pipeline = pipeline or FeaturePipeline()
+    data = pipeline.fit_transform(data)
+    
+    # Split into features and target, holding out the latest years
+    return time_split(data, pipeline.feature_columns)
+
+def prepare_data_for_gbm_category(data, category, pipeline=None):
+    # Filter for Boston city only
+    boston_data = data[data["City"] == category].copy()  # Explicitly create a copy
+    
+    # Create lag features and one-hot encode 'Variable' (fits the pipeline's encoder)
+    pipeline = pipeline or FeaturePipeline()
+    boston_data = pipeline.fit_transform(boston_data)
+    
+    # Split into features and target for Boston, holding out the latest years
+    return time_split(boston_data, pipeline.feature_columns)
+
+# Step 5: Train Gradient Boosting Model
+# Important: The predictions from this model should be used to predict the budget for Boston MA in 2025. 
+# This data is in a separate file and the comparison between machine predictions and actual data will be informative
+def train_gbm(X_train, X_test, y_train, y_test, params=None, backend=DEFAULT_BACKEND):
+    # Initialize and train the model, then evaluate it on the held-out years
+    _, mse, _ = fit_and_score_gbm(X_train, X_test, y_train, y_test, params, backend)
+    print(f"MSE:{mse}")
+    
+    return refit_gbm(X_train, X_test, y_train, y_test, params, backend)
+
+# The model that forecasts: refitted on the training and held-out years together,
+# since the holdout only scores the model and the forecast starts from the latest years
+def refit_gbm(X_train, X_test, y_train, y_test, params=None, backend=DEFAULT_BACKEND):
+    model = make_estimator(backend, X_train.columns, params)
+    return model.fit(pd.concat([X_train, X_test]), pd.concat([y_train, y_test]))
+
+# Fit a model of the given estimator backend (default hyperparameters unless params
+# are given, e.g. tuned ones) and return it with its test MSE and fit time in seconds
+def fit_and_score_gbm(X_train, X_test, y_train, y_test, params=None, backend=DEFAULT_BACKEND):
+    model = make_estimator(backend, X_train.columns, params)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start
+    
+    y_pred = model.predict(X_test)
+    return model, mean_squared_error(y_test, y_pred), fit_time
+
+# Train a model together with its fitted feature pipeline (all cities when category is None)
+# (backend picks the estimator and the feature encoding it needs, see models.estimators)
+def train_forecaster(data, category=None, lags=2, params=None, backend=DEFAULT_BACKEND):
+    pipeline = make_pipeline(backend, lags)
+    if category is None:
+        split = prepare_data_for_gbm_all(data, pipeline)
+    else:
+        split = prepare_data_for_gbm_category(data, category, pipeline)
+    return ForecastModel(pipeline, train_gbm(*split, params=params, backend=backend))
+
+# Artifact name of the forecaster for a category (all cities when None)
+def forecaster_name(category=None):
+    return "gbm_all" if category is None else "gbm_" + "".join(c if c.isalnum() else "_" for c in category)
+
+# Reuse a stored forecaster when the data and config are unchanged, otherwise train one
+# (params, e.g. from models.tuning.load_best_params, override the GBM defaults)
+def load_or_train_forecaster(data, category=None, lags=2, params=None, backend=DEFAULT_BACKEND):
+    config = {"category": category, "lags": lags}
+    if params:
+        config["params"] = sorted(params.items())
+    if backend != DEFAULT_BACKEND:
+        config["backend"] = backend
+    return load_or_fit(
+        lambda: train_forecaster(data, category, lags, params, backend),
+        data, forecaster_name(category), **config
+    )
+
+# In-sample predictions for every row with the model's own fitted pipeline
+# (series with no history yet are predicted as 0)
+def predict_history(data, model):
+    data = model.pipeline.transform(data.copy())
+    data["Predicted"] = model.predict(data)
+    data.loc[(data["Lag1"] == 0) & (data["Lag2"] == 0), "Predicted"] = 0
+    return data
+
+# Recursive forecast that advances every series one year per model call
+def forecast_series(city_data, model, start_year, end_year, lags=2):
+    lag_cols = lag_columns(lags)
+    encoded_cols = model.pipeline.encoded_columns
+
+    # The last actual year of each series seeds the forecast: next year's lags are
+    # this year's budget followed by this year's own lags
+    last_rows = city_data.groupby(["City", "Variable"], sort=False).tail(1)
+    history = last_rows[["Budget"] + lag_cols[:-1]].to_numpy(dtype=float)
+    encoded = last_rows[encoded_cols].to_numpy(dtype=float)
+    n_series = len(last_rows)
+
+    years = np.arange(start_year, end_year + 1)
+    lag_steps = []
+    predictions = []
+    for year in years:
+        # One predict call for all series at this horizon step
+        features = pd.DataFrame(
+            np.column_stack([np.full(n_series, year), history, encoded]),
+            columns=["Year"] + lag_cols + encoded_cols
+        )
+        prediction = model.predict(features)
+
+        # Series with no history at all are not forecast, and stay that way as the
+        # window rolls forward (the estimator predicts a small nonzero budget for them)
+        prediction = np.where((history == 0).all(axis=1), 0, prediction)
+        lag_steps.append(history)
+        predictions.append(prediction)
+
+        # Roll the lag window forward with the predictions
+        history = np.column_stack([prediction, history[:, :-1]])
+
+    # Build the future rows in one go, series-major like the historical rows
+    n_steps = len(years)
+    future_data = pd.DataFrame({
+        "Variable": np.tile(last_rows["Variable"].to_numpy(), n_steps),
+        "Year": np.repeat(years, n_series),
+        "City": np.tile(last_rows["City"].to_numpy(), n_steps),
+        "Budget": np.nan,
+    })
+    lag_values = np.vstack(lag_steps) if n_steps else np.empty((0, lags))
+    future_data = pd.concat([
+        future_data,
+        pd.DataFrame(lag_values, columns=lag_cols),
+        pd.DataFrame(np.tile(encoded, (n_steps, 1)), columns=encoded_cols),
+    ], axis=1)
+
+    prediction = np.concatenate(predictions) if n_steps else np.empty(0)
+    future_data["Predicted"] = prediction
+
+    # Calibrated models also get bands around every step: its horizon's relative
+    # residual quantiles (the last calibrated horizon's past it) times |prediction|
+    bands = model.residual_quantiles
+    if bands is not None:
+        steps = np.minimum(np.arange(n_steps), len(bands) - 1)
+        spread = np.repeat(bands.to_numpy()[steps], n_series, axis=0) * np.abs(prediction)[:, None]
+        future_data[list(bands.columns)] = prediction[:, None] + spread
+    return future_data
+
+# Step 8: Generate predictions on the future
+# category may be one city or a list of cities; all of them are forecast together
+def generate_future_predictions(data, model, category, start_year=2022, end_year=2022):
+    # Filter for the given city/category
+    cities = [category] if isinstance(category, str) else list(category)
+    
+    # Create lag features and encode with the model's own fitted pipeline
+    city_data = predict_history(data[data["City"].isin(cities)], model)
+    
+    city_data.dropna(inplace=True)
+    future_data = forecast_series(city_data, model, start_year, end_year, model.pipeline.lags)
+
+    # Concatenate the historical data with the predicted future data
+    complete_data = pd.concat([city_data, future_data], ignore_index=True)
+    complete_data = complete_data.sort_values(by=["Variable", "Year"], kind="stable").reset_index(drop=True)
+    return complete_data
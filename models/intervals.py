@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+from models.backtest import backtest
+from models.estimators import DEFAULT_BACKEND
+from models.forecaster import forecaster_name, generate_future_predictions, preprocess_data, train_forecaster
+from models.pipeline import load_or_fit
+
+# Quantiles of the prediction bands (P10/P50/P90)
+QUANTILES = (0.1, 0.5, 0.9)
+
+# Rolling-origin folds and horizon of the backtest the bands are calibrated on
+FOLDS = 5
+HORIZON = 4
+
+
+def band_columns(quantiles=QUANTILES):
+    return [f"P{round(q * 100)}" for q in quantiles]
+
+
+def residual_quantiles(forecasts, quantiles=QUANTILES):
+    # Quantiles of the relative forecast error (actual - predicted) / |predicted| per
+    # horizon step of backtest forecasts, one row per horizon and one column per band.
+    # Bands never narrow as the horizon grows: lower quantiles take the running
+    # minimum and upper ones the running maximum over the horizons before them.
+    # Series without history are forecast as zero at every step and left out.
+    # P50 is the median error, not zero: the recursive GBM trails growing budgets,
+    # so the bands are centered on the bias-corrected median rather than on the
+    # point forecast, and centering them would shift the P10-P90 coverage.
+    scored = forecasts[forecasts["Predicted"] != 0]
+    relative = (scored["Budget"] - scored["Predicted"]) / scored["Predicted"].abs()
+    table = relative.groupby(scored["horizon"]).quantile(list(quantiles)).unstack()
+    table.columns = band_columns(quantiles)
+    for q, col in zip(quantiles, table.columns):
+        if q < 0.5:
+            table[col] = table[col].cummin()
+        elif q > 0.5:
+            table[col] = table[col].cummax()
+    return table
+
+
+def calibrate(model, data, folds=FOLDS, horizon=HORIZON, jobs=None, backend=DEFAULT_BACKEND, quantiles=QUANTILES,
+              params=None):
+    # Conformal layer on a trained forecaster: the residual quantiles of a recursive
+    # rolling-origin backtest on the same data and hyperparameters, stored on the
+    # model. forecast_series then turns each point forecast into bands with one
+    # broadcast, so the bands come from the same predict call per horizon step as
+    # the point forecast.
+    forecasts = backtest(data, folds=folds, horizon=horizon, lags=model.pipeline.lags, jobs=jobs, backend=backend,
+                         params=params)
+    model.residual_quantiles = residual_quantiles(forecasts, quantiles)
+    return model
+
+
+def load_or_train_interval_forecaster(data, category=None, lags=2, params=None, backend=DEFAULT_BACKEND,
+                                      folds=FOLDS, horizon=HORIZON, quantiles=QUANTILES):
+    # Forecaster with calibrated bands, stored like the point forecaster (the backtest
+    # only reruns when the data or the configuration change)
+    subset = data if category is None else data[data["City"] == category]
+    config = {"category": category, "lags": lags, "folds": folds, "horizon": horizon, "quantiles": list(quantiles)}
+    if params:
+        config["params"] = sorted(params.items())
+    if backend != DEFAULT_BACKEND:
+        config["backend"] = backend
+    return load_or_fit(
+        lambda: calibrate(train_forecaster(data, category, lags, params, backend), subset, folds, horizon,
+                          backend=backend, quantiles=quantiles, params=params),
+        data, f"{forecaster_name(category)}_intervals", **config
+    )
+
+
+def interval_coverage(forecasts, table):
+    # Share of backtest actuals inside the outermost band, per horizon
+    steps = np.minimum(forecasts["horizon"].to_numpy(), table.index.max())
+    lower, upper = table.iloc[:, 0].reindex(steps).to_numpy(), table.iloc[:, -1].reindex(steps).to_numpy()
+    spread = forecasts["Predicted"].abs().to_numpy()
+    inside = forecasts["Budget"].between(forecasts["Predicted"] + lower * spread, forecasts["Predicted"] + upper * spread)
+    return inside.groupby(forecasts["horizon"]).mean()
+
+
+def test_intervals():
+    forecasts = pd.DataFrame({
+        "horizon": [1, 1, 1, 2, 2, 2],
+        "Predicted": [100.0, 100.0, 0.0, 100.0, 100.0, 100.0],
+        "Budget": [90.0, 110.0, 50.0, 95.0, 100.0, 105.0],
+    })
+    table = residual_quantiles(forecasts, (0.0, 0.5, 1.0))
+    assert table.columns.tolist() == ["P0", "P50", "P100"]
+    # Zero predictions have no relative error; the horizon 2 bands are widened to
+    # cover horizon 1's
+    assert table.loc[1].tolist() == [-0.1, 0.0, 0.1]
+    assert table.loc[2].tolist() == [-0.1, 0.0, 0.1]
+
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    model = calibrate(train_forecaster(data, "MA: Boston"), data[data["City"] == "MA: Boston"], folds=3, horizon=2, jobs=2)
+    complete = generate_future_predictions(data, model, "MA: Boston", start_year=2022, end_year=2025)
+    future = complete[complete["Year"] >= 2022]
+
+    # Every horizon step gets ordered bands (steps past the calibrated horizon reuse
+    # its widest bands); historical rows have none
+    assert len(future) == 4 * data.loc[data["City"] == "MA: Boston", "Variable"].nunique()
+    assert (future["P10"] <= future["P50"]).all() and (future["P50"] <= future["P90"]).all()
+    assert complete.loc[complete["Year"] < 2022, "P50"].isna().all()
+
+    # Series without history (Boston's utilities) stay zero at every step, and the
+    # others' lower band stays above zero
+    dead = future["Variable"].isin(["Electric Utility Spending", "Gas Utility Spending"])
+    assert (future.loc[dead, ["Predicted", "P10", "P50", "P90"]] == 0).all().all()
+    assert (future.loc[~dead, "P10"] > 0).all()
+
+
+if __name__ == "__main__":
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    boston = data[data["City"] == "MA: Boston"]
+    model = load_or_train_interval_forecaster(data, "MA: Boston")
+    print(model.residual_quantiles.to_string())
+    print("Coverage of the P10-P90 band on the calibration backtest:")
+    print(interval_coverage(backtest(boston, folds=FOLDS, horizon=HORIZON), model.residual_quantiles).to_string())
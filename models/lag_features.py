@@ -0,0 +1,182 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Columns that identify a single budget series (one line per city and variable)
+SERIES_KEYS = ["City", "Variable"]
+
+# Speedup over the row-wise builder that benchmark() requires at 1M rows
+MIN_SPEEDUP = 50
+
+
+def lag_columns(lags=2):
+    # Names of the lag features, e.g. ["Lag1", "Lag2"]
+    return [f"Lag{k}" for k in range(1, lags + 1)]
+
+
+# Shared lag-feature engine used by every GBM prep step
+def add_lag_features(data, lags=2, value_col="Budget"):
+    # Integer code of every row's series (Variable codes in name order, missing
+    # keys after every other code, as sort_values places them)
+    variable, variables = _codes(data["Variable"], sort=True)
+    city, cities = _codes(data["City"])
+    year, _ = _codes(data["Year"], sort=True)
+
+    # Rows in (Variable, Year) order, the order the prep functions have always produced
+    order = _lexsort((year, variable))
+    series = (variable * (len(cities) + 1) + city)[order]
+
+    # One stable sort of the presorted codes puts each series' rows together, still
+    # in year order, so every lag is a plain shift that is zeroed where it crosses
+    # into the previous series. The first k years of every series have no k-th lag
+    # and are filled with 0, which is what the model was trained on before.
+    by_series = np.argsort(series, kind="stable")
+    keys = series[by_series]
+    values = data[value_col].to_numpy()[order[by_series]]
+    lagged = {}
+    for k, col in enumerate(lag_columns(lags), start=1):
+        lagged[col] = np.zeros_like(values)
+        same = keys[k:] == keys[:-k]
+        lagged[col][k:][same] = values[:-k][same]
+
+    # Incomplete rows (missing series keys or values) are dropped, keeping their
+    # positions out of the index
+    complete = (variable < len(variables)) & (city < len(cities))
+    for col in data.columns.difference(SERIES_KEYS):
+        complete &= data[col].notna().to_numpy()
+    keep = complete[order]
+    rows = order[keep]
+    series_rows = np.empty_like(by_series)
+    series_rows[by_series] = np.arange(len(by_series))
+    series_rows = series_rows[keep]
+
+    # One take per column, wrapped without the copy DataFrame.take makes; the key
+    # columns are rebuilt from their few distinct values, which is cheaper than
+    # gathering a million scattered string references
+    encoded = {"Variable": (variable, variables), "City": (city, cities)}
+    columns = {}
+    for col in data.columns:
+        if col in encoded and not isinstance(data[col].dtype, pd.api.extensions.ExtensionDtype):
+            codes, uniques = encoded[col]
+            columns[col] = np.asarray(uniques, dtype=data[col].dtype).take(codes[rows])
+        else:
+            columns[col] = _take(data[col], rows)
+    columns.update((col, values[series_rows]) for col, values in lagged.items())
+    return pd.DataFrame(columns, index=np.flatnonzero(keep), copy=False)
+
+
+# Integer codes of a key column, with missing keys coded as len(uniques), and its
+# distinct values
+def _codes(column, sort=False):
+    codes, uniques = pd.factorize(column, sort=sort)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(uniques), codes)
+    return codes, uniques
+
+
+# Stable order by integer code arrays, least significant key first like np.lexsort.
+# Each key is a stable argsort of its own, which NumPy runs as a radix sort for
+# 16-bit codes.
+def _lexsort(keys):
+    order = np.arange(len(keys[0]))
+    for codes in keys:
+        codes = codes[order]
+        if codes.max(initial=0) < np.iinfo(np.int16).max:
+            codes = codes.astype(np.int16)
+        order = order[np.argsort(codes, kind="stable")]
+    return order
+
+
+# Rows of a column as an array of the same dtype (extension arrays such as
+# categoricals take themselves; NumPy columns take their ndarray directly)
+def _take(column, rows):
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype):
+        return column.array.take(rows)
+    return column.to_numpy().take(rows)
+
+
+# Tile the metro table with synthetic cities until it reaches roughly n_rows rows
+def scale_metro_table(data, n_rows=1_000_000, seed=0):
+    rng = np.random.default_rng(seed)
+    copies = max(1, int(np.ceil(n_rows / len(data))))
+    frames = []
+    for i in range(copies):
+        frame = data.copy()
+        frame["City"] = frame["City"] + f" #{i}"
+        frame["Budget"] = frame["Budget"] * rng.uniform(0.5, 1.5)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True).iloc[:n_rows]
+
+
+def benchmark(data, n_rows=1_000_000, repeat=5):
+    # Row-wise lag builder the prep functions used before the shared engine
+    def legacy_lag_features(data):
+        data = data.sort_values(by=["Variable", "Year"]).reset_index(drop=True)
+
+        data["Lag1"] = data["Budget"].shift(1)
+        data["Lag2"] = data["Budget"].shift(2)
+
+        data["Lag1"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag1"], axis=1)
+        data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 0 else row["Lag2"], axis=1)
+        data["Lag2"] = data.apply(lambda row: 0 if (row.name) % 22 == 1 else row["Lag2"], axis=1)
+
+        data.dropna(inplace=True)
+        return data
+
+    scaled = scale_metro_table(data, n_rows)
+
+    # Best of a few runs of the engine (the row-wise builder runs once, for minutes)
+    engine_time = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        add_lag_features(scaled)
+        engine_time = min(engine_time, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    legacy_lag_features(scaled)
+    legacy_time = time.perf_counter() - start
+
+    print(f"Rows: {len(scaled):,}")
+    print(f"Row-wise apply: {legacy_time:.2f}s")
+    print(f"Code shift:     {engine_time:.3f}s")
+    print(f"Speedup:        {legacy_time / engine_time:.0f}x")
+    if n_rows >= 1_000_000:
+        assert legacy_time / engine_time >= MIN_SPEEDUP, f"expected at least {MIN_SPEEDUP}x at 1M rows"
+    return legacy_time / engine_time
+
+
+def test_lag_features():
+    from models.forecaster import preprocess_data
+
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    boston = data[data["City"] == "MA: Boston"]
+
+    # Rows come in (Variable, Year) order, and each lag is the series' value k years
+    # earlier (0 before the series starts)
+    result = add_lag_features(boston)
+    assert result[["Variable", "Year"]].equals(result.sort_values(["Variable", "Year"])[["Variable", "Year"]])
+    previous = boston.assign(Year=boston["Year"] + 1)[SERIES_KEYS + ["Year", "Budget"]]
+    merged = result.merge(previous, on=SERIES_KEYS + ["Year"], how="left", suffixes=("", "_previous"))
+    assert (merged["Lag1"] == merged["Budget_previous"].fillna(0)).all()
+
+    # Lags stay inside each series and work for any number of lags
+    result = add_lag_features(data, lags=3)
+    first_years = result.groupby(SERIES_KEYS)["Year"].transform("min")
+    assert (result.loc[result["Year"] == first_years, lag_columns(3)] == 0).all().all()
+    second_years = result.groupby(SERIES_KEYS)["Year"].transform(lambda years: years.nsmallest(2).max())
+    assert (result.loc[result["Year"] == second_years, ["Lag2", "Lag3"]] == 0).all().all()
+
+    # Rows with a missing key or value are dropped, and the index keeps the
+    # positions of the remaining rows in (Variable, Year) order
+    gaps = boston.reset_index(drop=True)
+    gaps.loc[[3, 40], "City"] = None
+    gaps.loc[60, "Budget"] = np.nan
+    result = add_lag_features(gaps)
+    assert len(result) == len(gaps) - 3 and result["City"].notna().all()
+    assert result.index.is_monotonic_increasing and result.index.max() < len(gaps)
+
+
+if __name__ == "__main__":
+    from models.forecaster import preprocess_data
+
+    benchmark(preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv")))
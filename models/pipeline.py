@@ -0,0 +1,129 @@
+import hashlib
+import os
+import time
+from functools import lru_cache
+import joblib
+import pandas as pd
+import sklearn
+from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+from models.lag_features import add_lag_features, lag_columns
+
+# Trained models are stored here, one file per (name, training data, config)
+ARTIFACT_DIR = "models/artifacts"
+
+# Feature, training and calibration code; a change to any of these files changes
+# every artifact key, so a model fitted (or its bands calibrated) by older code is
+# never loaded as if it were current
+ARTIFACT_SOURCES = ["pipeline.py", "lag_features.py", "estimators.py", "forecaster.py", "backtest.py", "intervals.py"]
+
+
+# Columns encoded as integer category codes by the "categorical" encoding, and
+# the suffix of their feature columns (e.g. "City_code")
+CATEGORICAL_COLS = ["Variable", "City"]
+CODE_SUFFIX = "_code"
+
+
+# Lag features plus an encoder fitted once and reused: one-hot columns for
+# 'Variable' ("onehot"), or integer codes for 'Variable' and 'City' for
+# estimators with native categorical support ("categorical")
+class FeaturePipeline:
+    # Default for pipelines pickled before the encoding option existed
+    encoding = "onehot"
+
+    def __init__(self, lags=2, encoding="onehot"):
+        if encoding not in ("onehot", "categorical"):
+            raise ValueError(f"Unknown encoding: {encoding}")
+        self.lags = lags
+        self.encoding = encoding
+        self.encoder = None
+
+    def fit(self, data):
+        if self.encoding == "onehot":
+            self.encoder = OneHotEncoder(sparse_output=False, handle_unknown="ignore")
+            self.encoder.fit(data[["Variable"]])
+        else:
+            # Unseen categories get code -1, which the estimators treat as missing
+            self.encoder = OrdinalEncoder(handle_unknown="use_encoded_value", unknown_value=-1)
+            self.encoder.fit(data[CATEGORICAL_COLS])
+        return self
+
+    def transform(self, data):
+        # Lag features within each (City, Variable) series
+        data = add_lag_features(data, lags=self.lags)
+
+        # Encode with the fitted encoder so columns always line up
+        encoded_df = pd.DataFrame(
+            self.encoder.transform(data[self.encoded_inputs]),
+            columns=self.encoded_columns
+        )
+        return pd.concat([data.reset_index(drop=True), encoded_df], axis=1)
+
+    def fit_transform(self, data):
+        return self.fit(data).transform(data)
+
+    @property
+    def encoded_inputs(self):
+        return ["Variable"] if self.encoding == "onehot" else CATEGORICAL_COLS
+
+    @property
+    def encoded_columns(self):
+        # Feature columns produced by the encoder (constant along each series)
+        if self.encoding == "onehot":
+            return list(self.encoder.get_feature_names_out(["Variable"]))
+        return [col + CODE_SUFFIX for col in CATEGORICAL_COLS]
+
+    @property
+    def feature_columns(self):
+        return ["Year"] + lag_columns(self.lags) + self.encoded_columns
+
+
+# A fitted FeaturePipeline bundled with the estimator trained on its output
+class ForecastModel:
+    # Relative residual quantiles per horizon step (one column per band, e.g. P10),
+    # set by models.intervals.calibrate; None for point forecasts only
+    residual_quantiles = None
+
+    def __init__(self, pipeline, estimator):
+        self.pipeline = pipeline
+        self.estimator = estimator
+
+    def predict(self, features):
+        # Accepts any frame holding the pipeline's feature columns
+        return self.estimator.predict(features[self.pipeline.feature_columns])
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path):
+        return joblib.load(path)
+
+
+# SHA-256 of the feature and training source files, read once per process
+@lru_cache(maxsize=None)
+def source_digest(sources=tuple(ARTIFACT_SOURCES)):
+    digest = hashlib.sha256()
+    for name in sources:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+# Content hash of the training data and everything that changes the fitted model
+def artifact_key(data, **config):
+    return joblib.hash((data, sorted(config.items()), sklearn.__version__, source_digest()))
+
+
+# Load a stored model trained on exactly this data and config, or fit and store it
+def load_or_fit(fit, data, name, artifact_dir=ARTIFACT_DIR, **config):
+    path = os.path.join(artifact_dir, f"{name}-{artifact_key(data, **config)}.joblib")
+    if os.path.exists(path):
+        start = time.perf_counter()
+        model = ForecastModel.load(path)
+        print(f"Loaded {path} in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return model
+
+    model = fit()
+    model.save(path)
+    return model
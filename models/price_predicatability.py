@@ -1,110 +1,243 @@
+import os
+import re
+import time
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from common.plotly_export import save_figure
 
-# Load and preprocess data
-file_path = "data/budget_revisions_by_major_class.csv"  # Replace with your file path
-data = pd.read_csv(file_path)
-
-# Melt the DataFrame to long format for easier plotting
-proposed_cols = [col for col in data.columns if "(Proposed)" in col]
-revised_cols = [col for col in data.columns if "(Revised)" in col]
-
-long_data = pd.DataFrame()
-
-for proposed, revised in zip(proposed_cols, revised_cols):
-    year = proposed.split()[0]
-    subset = data.copy()
-    subset["year"] = year
-    subset["proposed_budget"] = data[proposed]
-    subset["revised_budget"] = data[revised]
-    subset = subset.drop(columns=proposed_cols + revised_cols)
-    long_data = pd.concat([long_data, subset], ignore_index=True)
-
-# Create the scatter plot using plotly.graph_objects for better control
-fig = go.Figure()
-
-# Add data for each year
-years = long_data["year"].unique()
-traces = []
-for year in years:
-    year_data = long_data[long_data["year"] == year]
-    trace = go.Scatter(
-        x=year_data["proposed_budget"],
-        y=year_data["revised_budget"],
-        mode="markers",
-        name=str(year),
-        marker=dict(size=10),
-        customdata=year_data.drop(columns=["proposed_budget", "revised_budget", "year"]).to_dict("records"),
-        hovertemplate="<br>".join([
-            "Proposed: %{x}",
-            "Revised: %{y}",
-            "%{customdata}"
-        ])
+REVISIONS_PATH = "data/budget_revisions_by_major_class.csv"
+
+# The revision figure is written here, as HTML and PNG
+OUTPUT_DIR = "./models/visualizations"
+
+# Wide columns holding one year's amounts, e.g. "2020 (Proposed)" and "2020 (Revised)"
+REVISION_COLUMN = re.compile(r"^(\d{4}) \((Proposed|Revised)\)$")
+
+
+def revision_columns(columns):
+    # Years with both a Proposed and a Revised column, the matching column pairs,
+    # and the remaining (descriptive) columns
+    pairs = {}
+    id_cols = []
+    for col in columns:
+        match = REVISION_COLUMN.match(col)
+        if match:
+            pairs.setdefault(int(match.group(1)), {})[match.group(2)] = col
+        else:
+            id_cols.append(col)
+
+    unpaired = sorted(year for year, kinds in pairs.items() if len(kinds) != 2)
+    if unpaired:
+        raise ValueError(f"Years without both a Proposed and a Revised column: {unpaired}")
+    years = sorted(pairs)
+    return years, [(pairs[year]["Proposed"], pairs[year]["Revised"]) for year in years], id_cols
+
+
+def revisions_long(data):
+    # One row per (line, year) with the proposed and revised amounts, built in a
+    # single reshape: the Proposed and Revised blocks are flattened year by year
+    # and the descriptive columns are tiled as categoricals (codes, not strings)
+    years, pairs, id_cols = revision_columns(data.columns)
+    n_rows, n_years = len(data), len(years)
+
+    long_data = {}
+    for col in id_cols:
+        codes, names = pd.factorize(data[col])
+        long_data[col] = pd.Categorical.from_codes(np.tile(codes, n_years), categories=names)
+    long_data["year"] = np.repeat(np.asarray(years, dtype=np.int16), n_rows)
+    long_data["proposed_budget"] = data[[proposed for proposed, _ in pairs]].to_numpy().ravel(order="F")
+    long_data["revised_budget"] = data[[revised for _, revised in pairs]].to_numpy().ravel(order="F")
+    return pd.DataFrame(long_data)
+
+
+def load_revisions_long(path=REVISIONS_PATH):
+    # Proposed-vs-revised budgets by major class in long format
+    return revisions_long(pd.read_csv(path))
+
+
+# Per-year copy and concat the module used to run at import time (kept for benchmarking)
+def _legacy_revisions_long(data):
+    proposed_cols = [col for col in data.columns if "(Proposed)" in col]
+    revised_cols = [col for col in data.columns if "(Revised)" in col]
+
+    long_data = pd.DataFrame()
+
+    for proposed, revised in zip(proposed_cols, revised_cols):
+        year = proposed.split()[0]
+        subset = data.copy()
+        subset["year"] = year
+        subset["proposed_budget"] = data[proposed]
+        subset["revised_budget"] = data[revised]
+        subset = subset.drop(columns=proposed_cols + revised_cols)
+        long_data = pd.concat([long_data, subset], ignore_index=True)
+    return long_data
+
+
+# Extend the wide table to n_years of revision columns by repeating its years
+def scale_revision_years(data, n_years):
+    years, pairs, id_cols = revision_columns(data.columns)
+    wide = {col: data[col] for col in id_cols}
+    for i in range(n_years):
+        proposed, revised = pairs[i % len(pairs)]
+        year = years[0] + i
+        wide[f"{year} (Proposed)"] = data[proposed]
+        wide[f"{year} (Revised)"] = data[revised]
+    return pd.DataFrame(wide)
+
+
+def benchmark(data, year_counts=(6, 25, 50, 100, 200)):
+    # Time per reshape as the number of revision years grows: the single reshape
+    # grows linearly, the per-year concat quadratically
+    print(f"{'Years':>6} {'Per-year concat':>16} {'Single reshape':>15}")
+    for n_years in year_counts:
+        wide = scale_revision_years(data, n_years)
+
+        start = time.perf_counter()
+        _legacy_revisions_long(wide)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        revisions_long(wide)
+        reshape_time = time.perf_counter() - start
+
+        print(f"{n_years:>6} {legacy_time:>15.3f}s {reshape_time:>14.4f}s")
+
+
+# Above this many points the scatter uses WebGL (Scattergl) traces, which stay
+# interactive with hundreds of thousands of markers where SVG traces do not
+WEBGL_THRESHOLD = 5000
+
+
+def visibility_masks(years, proposed, revised):
+    # Visibility of the per-year traces for every button, from one pass over the
+    # points: the traces are the distinct years in order of appearance
+    trace_years, first_rows, trace_of_row = np.unique(years, return_index=True, return_inverse=True)
+    order = np.argsort(first_rows)
+    trace_years = trace_years[order]
+    trace_of_row = np.argsort(order)[trace_of_row]
+
+    # "Remove x=y": a trace stays visible if any of its points is off the diagonal
+    off_diagonal = np.bincount(trace_of_row, weights=proposed != revised, minlength=len(trace_years)) > 0
+    masks = {
+        "Show All Points": np.ones(len(trace_years), dtype=bool),
+        "Remove x=y": off_diagonal,
+    }
+
+    # "Show <year>": only that year's trace
+    for i, year in enumerate(trace_years):
+        masks[f"Show {year}"] = np.arange(len(trace_years)) == i
+    return trace_years, trace_of_row, masks
+
+
+def build_figure(long_data, webgl_threshold=WEBGL_THRESHOLD):
+    # Create the scatter plot using plotly.graph_objects for better control
+    fig = go.Figure()
+
+    proposed = long_data["proposed_budget"].to_numpy()
+    revised = long_data["revised_budget"].to_numpy()
+    trace_years, trace_of_row, masks = visibility_masks(long_data["year"].to_numpy(), proposed, revised)
+
+    # Descriptive columns shown on hover, one customdata column each
+    id_cols = [col for col in long_data.columns if col not in ("proposed_budget", "revised_budget", "year")]
+    details = np.column_stack([long_data[col].astype(object).to_numpy() for col in id_cols])
+    hovertemplate = "<br>".join(
+        ["Proposed: %{x}", "Revised: %{y}"] + [f"{col}: %{{customdata[{i}]}}" for i, col in enumerate(id_cols)]
     )
-    fig.add_trace(trace)
-
-# Add a dashed line y = x
-fig.add_shape(
-    type="line",
-    x0=long_data["proposed_budget"].min(),
-    y0=long_data["proposed_budget"].min(),
-    x1=long_data["proposed_budget"].max(),
-    y1=long_data["proposed_budget"].max(),
-    line=dict(color="LightGray", dash="dash"),
-    name="x = y"
-)
-
-# Create buttons
-buttons = [
-    dict(
-        label="Show All Points",
-        method="update",
-        args=[{"visible": [True] * len(fig.data)}]
-    ),
-    dict(
-        label="Remove x=y",
-        method="update",
-        args=[
-            {"visible": [
-                any(
-                    trace.x[i] != trace.y[i]
-                    for i in range(len(trace.x))
-                )
-                for trace in fig.data
-            ]}
-        ]
+    scatter = go.Scattergl if len(long_data) > webgl_threshold else go.Scatter
+
+    # Add data for each year; rows are split by year once
+    rows_by_trace = np.argsort(trace_of_row, kind="stable")
+    bounds = np.cumsum(np.bincount(trace_of_row, minlength=len(trace_years)))[:-1]
+    for year, rows in zip(trace_years, np.split(rows_by_trace, bounds)):
+        fig.add_trace(scatter(
+            x=proposed[rows],
+            y=revised[rows],
+            mode="markers",
+            name=str(year),
+            marker=dict(size=10),
+            customdata=details[rows],
+            hovertemplate=hovertemplate
+        ))
+
+    # Add a dashed line y = x
+    fig.add_shape(
+        type="line",
+        x0=proposed.min(),
+        y0=proposed.min(),
+        x1=proposed.max(),
+        y1=proposed.max(),
+        line=dict(color="LightGray", dash="dash"),
+        name="x = y"
     )
-]
 
-# Add a button for each year
-for year in years:
-    visibility = [
-        trace.name == str(year) for trace in fig.data
+    # One button per precomputed mask
+    buttons = [
+        dict(label=label, method="update", args=[{"visible": mask.tolist()}])
+        for label, mask in masks.items()
     ]
-    buttons.append(
-        dict(
-            label=f"Show {year}",
-            method="update",
-            args=[{"visible": visibility}]
-        )
+
+    # Add the buttons to the layout
+    fig.update_layout(
+        updatemenus=[
+            dict(
+                type="buttons",
+                direction="down",
+                buttons=buttons,
+                pad={"r": 10, "t": 10},
+                showactive=True,
+                x=0.1,
+                xanchor="left",
+                y=1.1,
+                yanchor="top"
+            )
+        ]
     )
+    return fig
 
-# Add the buttons to the layout
-fig.update_layout(
-    updatemenus=[
-        dict(
-            type="buttons",
-            direction="down",
-            buttons=buttons,
-            pad={"r": 10, "t": 10},
-            showactive=True,
-            x=0.1,
-            xanchor="left",
-            y=1.1,
-            yanchor="top"
-        )
-    ]
-)
 
-# Show the plot
-fig.show()
+def test_revisions_long():
+    data = pd.read_csv(REVISIONS_PATH)
+    result = load_revisions_long()
+
+    # Same rows, in the same order, as the old per-year concat
+    expected = _legacy_revisions_long(data)
+    expected["year"] = expected["year"].astype(np.int16)
+    pd.testing.assert_frame_equal(result, expected, check_categorical=False, check_dtype=False)
+    assert isinstance(result["dept_name"].dtype, pd.CategoricalDtype)
+
+    # Column pairs are matched by year, not by position
+    shuffled = data[list(reversed(data.columns))]
+    pd.testing.assert_frame_equal(revisions_long(shuffled)[result.columns], result)
+
+
+def test_build_figure():
+    long_data = load_revisions_long()
+    fig = build_figure(long_data)
+    buttons = {button.label: list(button.args[0]["visible"]) for button in fig.layout.updatemenus[0].buttons}
+
+    # The masks match a point-by-point check of each trace
+    assert buttons["Remove x=y"] == [any(x != y for x, y in zip(trace.x, trace.y)) for trace in fig.data]
+    for trace in fig.data:
+        assert buttons[f"Show {trace.name}"] == [other.name == trace.name for other in fig.data]
+    assert sum(len(trace.x) for trace in fig.data) == len(long_data)
+
+    # Large figures switch to WebGL traces
+    assert isinstance(fig.data[0], go.Scatter)
+    assert isinstance(build_figure(long_data, webgl_threshold=100).data[0], go.Scattergl)
+
+
+def main():
+    fig = build_figure(load_revisions_long())
+
+    # Save the plot (and show it when there is a display)
+    save_figure(fig, os.path.join(OUTPUT_DIR, "proposed_vs_revised_interactive"))
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--benchmark" in sys.argv:
+        benchmark(pd.read_csv(REVISIONS_PATH))
+    else:
+        main()
@@ -0,0 +1,136 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from models.price_predicatability import REVISIONS_PATH, load_revisions_long
+
+# Scores and rankings are written here as Parquet (columnar) files
+OUTPUT_DIR = "models/artifacts"
+
+# Years in the rolling predictability window
+WINDOW = 3
+
+CLASS_COL = "major_class_description"
+
+
+def revision_metrics(long_data, window=WINDOW, by=CLASS_COL):
+    # Accuracy of the proposed budgets per (class, year), from one grouped pass over
+    # the line items:
+    #   error       total revised - proposed (positive: revised up)
+    #   abs_error   sum of the line-level |revised - proposed|
+    #   bias        mean line-level error
+    #   pct_bias    error / total proposed
+    #   mape        mean |error| / |proposed| over lines with a non-zero proposal
+    #   wape        abs_error / total |proposed| (also counts lines proposed at 0)
+    # and a rolling score over the last `window` years: 1 / (1 + mean wape), so 1
+    # means every revision matched its proposal and the score falls as they drift
+    proposed = long_data["proposed_budget"].to_numpy(dtype=float)
+    revised = long_data["revised_budget"].to_numpy(dtype=float)
+    error = revised - proposed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ape = np.where(proposed != 0, np.abs(error) / np.abs(proposed), np.nan)
+
+    lines = pd.DataFrame({
+        by: long_data[by],
+        "year": long_data["year"],
+        "proposed": proposed,
+        "revised": revised,
+        "error": error,
+        "abs_error": np.abs(error),
+        "abs_proposed": np.abs(proposed),
+        "ape": ape,
+    })
+    metrics = lines.groupby([by, "year"], observed=True, sort=True).agg(
+        lines=("error", "size"),
+        proposed=("proposed", "sum"),
+        revised=("revised", "sum"),
+        error=("error", "sum"),
+        abs_error=("abs_error", "sum"),
+        bias=("error", "mean"),
+        abs_proposed=("abs_proposed", "sum"),
+        mape=("ape", "mean"),
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        metrics["pct_bias"] = metrics["error"] / metrics["proposed"]
+        metrics["wape"] = metrics["abs_error"] / metrics["abs_proposed"]
+    metrics = metrics.drop(columns="abs_proposed")
+
+    # Rolling window within each class; rows are sorted by (class, year)
+    rolling_wape = (metrics["wape"].groupby(level=by, observed=True)
+                    .rolling(window, min_periods=1).mean()
+                    .droplevel(0))
+    metrics["rolling_wape"] = rolling_wape
+    metrics["predictability"] = 1 / (1 + rolling_wape)
+    return metrics.reset_index()
+
+
+def rank_classes(metrics, by=CLASS_COL):
+    # One row per class, most predictable first: ranked on the latest rolling
+    # score, ties broken by the average wape over all years
+    latest = metrics.sort_values("year").groupby(by, observed=True).last()
+    summary = metrics.groupby(by, observed=True).agg(
+        years=("year", "size"),
+        mean_mape=("mape", "mean"),
+        mean_wape=("wape", "mean"),
+        mean_pct_bias=("pct_bias", "mean"),
+    )
+    summary["latest_year"] = latest["year"]
+    summary["predictability"] = latest["predictability"]
+    summary = summary.sort_values(["predictability", "mean_wape"], ascending=[False, True])
+    summary["rank"] = np.arange(1, len(summary) + 1)
+    return summary.reset_index()
+
+
+def export_revision_analytics(path=REVISIONS_PATH, output_dir=OUTPUT_DIR, window=WINDOW):
+    # Refresh the per-class, per-year metrics and the ranking of all classes
+    start = time.perf_counter()
+    metrics = revision_metrics(load_revisions_long(path), window)
+    ranking = rank_classes(metrics)
+
+    os.makedirs(output_dir, exist_ok=True)
+    metrics_path = os.path.join(output_dir, "revision_metrics.parquet")
+    ranking_path = os.path.join(output_dir, "revision_predictability_ranking.parquet")
+    metrics.to_parquet(metrics_path, index=False)
+    ranking.to_parquet(ranking_path, index=False)
+
+    print(f"Wrote {metrics_path} ({len(metrics)} rows) and {ranking_path} ({len(ranking)} classes) "
+          f"in {time.perf_counter() - start:.2f}s")
+    return metrics, ranking
+
+
+def test_revision_metrics():
+    long_data = pd.DataFrame({
+        CLASS_COL: pd.Categorical(["A", "A", "B", "A", "A", "B"]),
+        "year": [2020, 2020, 2020, 2021, 2021, 2021],
+        "proposed_budget": [100, 0, 50, 100, 100, 50],
+        "revised_budget": [110.0, 10.0, 50.0, 100.0, 100.0, 50.0],
+    })
+    metrics = revision_metrics(long_data, window=2).set_index([CLASS_COL, "year"])
+
+    a_2020 = metrics.loc[("A", 2020)]
+    assert a_2020["error"] == 20 and a_2020["abs_error"] == 20
+    assert a_2020["bias"] == 10
+    assert np.isclose(a_2020["mape"], 0.1)     # the line proposed at 0 has no percentage error
+    assert np.isclose(a_2020["wape"], 0.2)     # but counts in the weighted error
+    assert np.isclose(metrics.loc[("A", 2021), "rolling_wape"], 0.1)
+    assert metrics.loc[("B", 2021), "predictability"] == 1
+
+    # Class B never deviates from its proposals, so it ranks first
+    ranking = rank_classes(metrics.reset_index())
+    assert ranking[CLASS_COL].tolist() == ["B", "A"]
+    assert ranking["rank"].tolist() == [1, 2]
+
+
+def test_revision_analytics_on_data():
+    metrics = revision_metrics(load_revisions_long())
+    ranking = rank_classes(metrics)
+
+    # Every class is scored every year, and the scores are in (0, 1]
+    assert len(metrics) == metrics[CLASS_COL].nunique() * metrics["year"].nunique()
+    assert metrics["predictability"].between(0, 1, inclusive="right").all()
+    assert sorted(ranking["rank"]) == list(range(1, len(ranking) + 1))
+
+
+if __name__ == "__main__":
+    _, ranking = export_revision_analytics()
+    print(ranking.to_string(index=False))
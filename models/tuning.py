@@ -0,0 +1,221 @@
+import itertools
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from models.estimators import DEFAULT_BACKEND, get_backend, make_estimator, make_pipeline
+from models.forecaster import backtest_origins, forecaster_name, load_or_train_forecaster, preprocess_data
+from models.pipeline import ARTIFACT_DIR
+
+# What is tuned for an estimator backend: the hyperparameters searched, the number
+# of boosting stages (the resource that successive halving grows between rounds and
+# that early stopping then trims), and fixed settings used only while scoring
+Tuning = namedtuple("Tuning", ["space", "resource", "fixed"])
+
+TUNING = {
+    "gbm": Tuning({
+        "max_depth": [2, 3, 4, 5],
+        "learning_rate": [0.01, 0.03, 0.1, 0.3],
+        "subsample": [0.6, 0.8, 1.0],
+    }, "n_estimators", {}),
+    # Its own early stopping would end folds at different stages
+    "hist_gbm": Tuning({
+        "max_depth": [2, 3, 4, None],
+        "learning_rate": [0.01, 0.03, 0.1, 0.3],
+        "max_leaf_nodes": [7, 15, 31],
+    }, "max_iter", {"early_stopping": False}),
+}
+
+# Each round keeps the best 1/ETA of the candidates and gives them ETA times the estimators
+ETA = 3
+MIN_ESTIMATORS = 50
+MAX_ESTIMATORS = 450
+
+# Fold matrices of one backend's features and the columns they hold
+Folds = namedtuple("Folds", ["backend", "columns", "matrices"])
+
+# Validation folds of the worker process, set once by _init_worker
+_folds = None
+
+
+def get_tuning(backend):
+    # Unknown backends fail as they do everywhere else; known ones also need an entry here
+    get_backend(backend)
+    if backend not in TUNING:
+        raise ValueError(f"No search space for estimator backend: {backend}")
+    return TUNING[backend]
+
+
+def build_folds(data, folds=4, lags=2, backend=DEFAULT_BACKEND):
+    # Time-ordered validation folds: for each origin year, train on every row up to
+    # it and validate on the year after it. The feature matrices are built once,
+    # as float arrays with the backend's encoding, and reused by every candidate
+    # and round.
+    pipeline = make_pipeline(backend, lags)
+    features = pipeline.fit_transform(data)
+    X = features[pipeline.feature_columns].to_numpy(dtype=np.float64)
+    y = features["Budget"].to_numpy(dtype=np.float64)
+    years = features["Year"].to_numpy()
+
+    matrices = []
+    for origin in backtest_origins(years, folds):
+        train, valid = years <= origin, years == origin + 1
+        matrices.append((X[train], y[train], X[valid], y[valid]))
+    return Folds(backend, pipeline.feature_columns, matrices)
+
+
+def _init_worker(folds):
+    # The fold matrices are sent to each worker once, not with every task
+    global _folds
+    _folds = folds
+
+
+def score_candidate(params, n_estimators):
+    # Validation MSE after every boosting stage, averaged over the folds; the
+    # candidate is early-stopped at the stage with the lowest average error
+    tuning = get_tuning(_folds.backend)
+    curves = []
+    for X_train, y_train, X_valid, y_valid in _folds.matrices:
+        model = make_estimator(_folds.backend, _folds.columns,
+                               {**tuning.fixed, tuning.resource: n_estimators, **params})
+        model.fit(X_train, y_train)
+        curves.append([np.mean((y_valid - pred) ** 2) for pred in model.staged_predict(X_valid)])
+    curve = np.mean(curves, axis=0)
+    best = int(np.argmin(curve))
+    return float(curve[best]), best + 1
+
+
+def score_defaults(folds):
+    # Validation MSE of the untuned estimator as it is actually trained: default
+    # hyperparameters and every boosting stage (no early stopping), averaged over the folds
+    errors = []
+    for X_train, y_train, X_valid, y_valid in folds.matrices:
+        model = make_estimator(folds.backend, folds.columns)
+        model.fit(X_train, y_train)
+        errors.append(np.mean((y_valid - model.predict(X_valid)) ** 2))
+    return float(np.mean(errors))
+
+
+def sample_candidates(n_candidates, seed=0, backend=DEFAULT_BACKEND):
+    # Distinct random configurations from the backend's search space
+    space = get_tuning(backend).space
+    grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+    picks = np.random.default_rng(seed).choice(len(grid), size=min(n_candidates, len(grid)), replace=False)
+    return [grid[i] for i in picks]
+
+
+def successive_halving(folds, n_candidates=27, eta=ETA, min_estimators=MIN_ESTIMATORS,
+                       max_estimators=MAX_ESTIMATORS, jobs=None, seed=0):
+    # Every candidate is scored with min_estimators, the best 1/eta move on with eta
+    # times the estimators, and so on until one is left or max_estimators is reached.
+    # Candidates of a round are scored in parallel. Returns the best configuration
+    # (with its number of stages under the backend's resource name, e.g. max_iter)
+    # and a table of every evaluation.
+    resource = get_tuning(folds.backend).resource
+    candidates = sample_candidates(n_candidates, seed, folds.backend)
+    history = []
+    n_estimators = min_estimators
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(folds,)) as pool:
+        while True:
+            start = time.perf_counter()
+            scores = list(pool.map(score_candidate, candidates, [n_estimators] * len(candidates)))
+            for params, (mse, best_n) in zip(candidates, scores):
+                history.append({**params, "budget": n_estimators, resource: best_n, "mse": mse})
+            print(f"{len(candidates):3d} candidates x {n_estimators:3d} estimators: "
+                  f"best MSE {min(mse for mse, _ in scores):,.0f} ({time.perf_counter() - start:.1f}s)")
+
+            order = np.argsort([mse for mse, _ in scores], kind="stable")
+            if len(candidates) == 1 or n_estimators * eta > max_estimators:
+                best = order[0]
+                return {**candidates[best], resource: scores[best][1]}, pd.DataFrame(history)
+            candidates = [candidates[i] for i in order[:max(1, len(candidates) // eta)]]
+            n_estimators *= eta
+
+
+def best_params_path(category=None, backend=DEFAULT_BACKEND, artifact_dir=ARTIFACT_DIR):
+    # Stored next to the forecaster's artifacts, one file per backend, e.g.
+    # models/artifacts/gbm_MA__Boston.gbm.params.json
+    return os.path.join(artifact_dir, f"{forecaster_name(category)}.{backend}.params.json")
+
+
+def load_best_params(category=None, backend=DEFAULT_BACKEND, artifact_dir=ARTIFACT_DIR):
+    # Tuned hyperparameters for the category and backend, or None if they were never tuned
+    path = best_params_path(category, backend, artifact_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        stored = json.load(file)
+    return stored["params"] if stored.get("backend") == backend else None
+
+
+def tune_forecaster(data, category=None, folds=4, n_candidates=27, jobs=None, backend=DEFAULT_BACKEND,
+                    artifact_dir=ARTIFACT_DIR):
+    # Search the backend's hyperparameters on time-ordered folds, persist the best
+    # configuration next to the model (none when the defaults score better), and
+    # train (or load) the forecaster with it
+    start = time.perf_counter()
+    subset = data if category is None else data[data["City"] == category]
+    fold_matrices = build_folds(subset, folds, backend=backend)
+    best, history = successive_halving(fold_matrices, n_candidates, jobs=jobs)
+
+    # The defaults on the same folds, for comparison
+    default_mse = score_defaults(fold_matrices)
+    tuned_mse = history.loc[history["budget"] == history["budget"].max(), "mse"].min()
+    if default_mse <= tuned_mse:
+        # No candidate beat the defaults: store no overrides
+        best = {}
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    with open(best_params_path(category, backend, artifact_dir), "w") as file:
+        json.dump({"category": category, "backend": backend, "params": best, "validation_mse": tuned_mse,
+                   "default_validation_mse": default_mse, "folds": folds}, file, indent=2)
+    print(f"Best {best}: validation MSE {tuned_mse:,.0f} (defaults {default_mse:,.0f}), "
+          f"tuned in {time.perf_counter() - start:.1f}s")
+
+    model = load_or_train_forecaster(data, category, params=best, backend=backend)
+    return best, history, model
+
+
+def test_successive_halving(tmp_path):
+    data = preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv"))
+    boston = data[data["City"] == "MA: Boston"]
+
+    for backend in TUNING:
+        folds = build_folds(boston, folds=2, backend=backend)
+        tuning = TUNING[backend]
+
+        # Validation years come strictly after their training years
+        assert len(folds.matrices) == 2
+        assert all(len(X_valid) == len(y_valid) > 0 for _, _, X_valid, y_valid in folds.matrices)
+
+        # Candidates come from the backend's own search space and stage count
+        best, history = successive_halving(folds, n_candidates=4, eta=2, min_estimators=10,
+                                           max_estimators=40, jobs=2)
+        assert set(best) == set(tuning.space) | {tuning.resource}
+        assert 1 <= best[tuning.resource] <= 40
+        assert history.groupby("budget").size().to_dict() == {10: 4, 20: 2, 40: 1}
+
+        # The defaults baseline runs every stage; early stopping at the best one
+        # can only do better
+        _init_worker(folds)
+        assert score_candidate({}, 100)[0] <= score_defaults(folds)
+
+    # Stored parameters are only returned for the backend they were tuned for
+    with open(best_params_path("MA: Boston", "gbm", tmp_path), "w") as file:
+        json.dump({"category": "MA: Boston", "backend": "gbm", "params": {"max_depth": 2}}, file)
+    assert load_best_params("MA: Boston", "gbm", tmp_path) == {"max_depth": 2}
+    assert load_best_params("MA: Boston", "hist_gbm", tmp_path) is None
+
+
+if __name__ == "__main__":
+    # --all tunes the pooled model of every city (category None)
+    if "--all" in sys.argv:
+        category = None
+    else:
+        category = sys.argv[sys.argv.index("--category") + 1] if "--category" in sys.argv else "MA: Boston"
+    backend = sys.argv[sys.argv.index("--backend") + 1] if "--backend" in sys.argv else DEFAULT_BACKEND
+    tune_forecaster(preprocess_data(pd.read_csv("data/MajorMetroCityBudgets.csv")), category, backend=backend)
@@ -1,6 +1,9 @@
 import pandas as pd
 import plotly.express as px
 import os
+from common.loaders import load_operating_budget
+from common.schema import sum_by, to_dollars
+from common.plotly_export import save_figure
 
 # Ensure the output directory exists
 output_dir = './program/visualizations/interactive/'
@@ -8,13 +11,10 @@ os.makedirs(output_dir, exist_ok=True)
 
 def generate_interactive_pie(path):
     # Load data
-    df = pd.read_csv(path)
-
-    # Handle missing values
-    df = df.replace('#Missing', pd.NA).apply(pd.to_numeric, errors='ignore')
+    df = load_operating_budget(path)
 
     # Aggregate FY25 budget by program
-    fy25_budget = df.groupby('Program')['FY25 Budget'].sum()
+    fy25_budget = sum_by(df, 'Program', 'FY25 Budget')
 
     # Sort the programs by their FY25 budget in descending order
     fy25_budget = fy25_budget.sort_values(ascending=False)
@@ -43,32 +43,21 @@ def generate_interactive_pie(path):
     )
 
 
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir, 'budget_by_program_interactive_pie.html'))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, 'budget_by_program_interactive_pie.png'))
-
-    # Show the figure in the notebook
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, 'budget_by_program_interactive_pie'))
 
 def generate_interactive_changes(path):
     # Load Data
-    df = pd.read_csv(path)
-    df['FY25 Budget'] = pd.to_numeric(df['FY25 Budget'], errors='coerce')
-    df['FY24 Appropriation'] = pd.to_numeric(df['FY24 Appropriation'], errors='coerce')
-    df['FY23 Actual Expense'] = pd.to_numeric(df['FY23 Actual Expense'], errors='coerce')
-    df['FY22 Actual Expense'] = pd.to_numeric(df['FY22 Actual Expense'], errors='coerce')
+    df = load_operating_budget(path)
     df = df.dropna(subset=['FY25 Budget', 'FY24 Appropriation', 'FY23 Actual Expense', 'FY22 Actual Expense'])
 
     # Aggregate Data for Top Programs
-    top_programs = df.groupby('Program')['FY25 Budget'].sum().nlargest(10).index
-    spending_over_time = df.melt(
+    top_programs = sum_by(df, 'Program', 'FY25 Budget').nlargest(10).index
+    spending_over_time = to_dollars(df[df['Program'].isin(top_programs)]).melt(
         id_vars=['Program'], 
         value_vars=['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget'],
         var_name='Year', value_name='Amount'
     )
-    spending_over_time = spending_over_time[spending_over_time['Program'].isin(top_programs)]
 
     # Create Line Chart
     fig = px.line(
@@ -83,24 +72,16 @@ def generate_interactive_changes(path):
     fig.update_yaxes(tickprefix="$", title="Spending Amount")
     fig.update_xaxes(title="Fiscal Year")
 
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir, 'budget_by_program_over_time_interactive.html'))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, 'budget_by_program_over_time_interactive.png'))
-
-    # Show the figure in the notebook
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, 'budget_by_program_over_time_interactive'))
 
 
 def volatility_changes_interactive(path, mode):
-    df = pd.read_csv(path)
+    df = load_operating_budget(path)
 
-    # Calculate changes
-    for col in ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
     df.dropna(subset=['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget'], inplace=True)
-    df_grouped = df.groupby('Program', as_index=False).sum()
+    df_grouped = sum_by(df, 'Program', ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation',
+                                        'FY25 Budget']).reset_index()
     df_grouped['Change_22_23'] = df_grouped['FY23 Actual Expense'] - df_grouped['FY22 Actual Expense']
     df_grouped['Change_23_24'] = df_grouped['FY24 Appropriation'] - df_grouped['FY23 Actual Expense']
     df_grouped['Change_24_25'] = df_grouped['FY25 Budget'] - df_grouped['FY24 Appropriation']
@@ -139,26 +120,17 @@ def volatility_changes_interactive(path, mode):
         title=title,
         markers=True
     )
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir,f"{filename}.html"))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, f"{filename}.png"))
-
-    # Show the figure in the notebook
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, filename))
 
 
 def program_change_volatility_comparison_interactive(path):
-    df = pd.read_csv(path)
-    # Ensure numeric data
+    df = load_operating_budget(path)
     numeric_columns = ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']
-    for col in numeric_columns:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
     df = df.dropna(subset=numeric_columns)  # Drop rows with invalid data
 
     # Calculate total volatility
-    df_grouped = df.groupby('Program', as_index=False).sum()
+    df_grouped = sum_by(df, 'Program', numeric_columns).reset_index()
     df_grouped['Total_Volatility'] = df_grouped[
         ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']
     ].std(axis=1)
@@ -173,14 +145,8 @@ def program_change_volatility_comparison_interactive(path):
         color = 'Program'
     )
 
-    # Save as HTML
-    fig.write_html(os.path.join(output_dir,'volatility_comparison_by_program_interactive.html'))
-
-    # Save as static image
-    fig.write_image(os.path.join(output_dir, 'volatility_comparison_by_program_interactive.png'))
-
-    # Show the figure in the notebook
-    fig.show()
+    # Save as HTML and PNG (and show it when a display is available)
+    save_figure(fig, os.path.join(output_dir, 'volatility_comparison_by_program_interactive'))
 
 
 
@@ -195,4 +161,5 @@ def main():
     program_change_volatility_comparison_interactive(path)
 
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
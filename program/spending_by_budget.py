@@ -1,16 +1,20 @@
+import os
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
+from common.loaders import OPERATING_BUDGET_PATH, load_operating_budget
+from common.schema import sum_by
+
+# Ensure the output directory exists
+output_dir = './program/visualizations/'
+os.makedirs(output_dir, exist_ok=True)
 
 def generate_visualization(path):
     # Create DataFrame
-    df = pd.read_csv(path)
-
-    # Handle missing values
-    df = df.replace('#Missing', pd.NA).apply(pd.to_numeric, errors='ignore')
+    df = load_operating_budget(path)
 
     # Aggregate FY25 budget by program
-    fy25_budget = df.groupby('Program')['FY25 Budget'].sum()
+    fy25_budget = sum_by(df, 'Program', 'FY25 Budget')
 
     # Sort the programs by their FY25 budget in descending order
     fy25_budget = fy25_budget.sort_values(ascending=False)
@@ -54,22 +58,21 @@ def generate_visualization(path):
     ax.legend(legend_handles, legend_labels, title="Programs", loc="best", frameon=False)
 
     plt.title('FY25 Budget Projections by Program')
-    plt.show()
+
+    # Save the figure as a PNG file
+    plt.savefig(os.path.join(output_dir, 'predicted_budget.png'))
+    plt.close()
     return
 
 def generate_changes(path):
     # Create DataFrame
-    df = pd.read_csv(path)
-    df['FY25 Budget'] = pd.to_numeric(df['FY25 Budget'], errors='coerce')
-    df['FY24 Appropriation'] = pd.to_numeric(df['FY24 Appropriation'], errors='coerce')
-    df['FY23 Actual Expense'] = pd.to_numeric(df['FY23 Actual Expense'], errors='coerce')
-    df['FY22 Actual Expense'] = pd.to_numeric(df['FY22 Actual Expense'], errors='coerce')
+    df = load_operating_budget(path)
 
     # Drop rows with NaN values in 'FY25 Budget'
     df = df.dropna(subset=['FY25 Budget','FY24 Appropriation', 'FY23 Actual Expense', 'FY22 Actual Expense'])
     # Aggregate total spending for FY25 to highlight top programs
       # Aggregate FY25 spending to find the top 10 programs
-    top_programs = df.groupby('Program')['FY25 Budget'].sum().nlargest(10).index
+    top_programs = sum_by(df, 'Program', 'FY25 Budget').nlargest(10).index
 
     # Reshape data for line plot (spending over time by program)
     spending_over_time = df.melt(
@@ -83,9 +86,7 @@ def generate_changes(path):
     spending_over_time.dropna(subset=['Amount'], inplace=True)
 
     # Group by program and year to sum amounts
-    spending_over_time = spending_over_time.groupby(
-        ['Program', 'Year'], as_index=False
-    ).sum()
+    spending_over_time = sum_by(spending_over_time, ['Program', 'Year'], 'Amount').reset_index()
 
     # Ensure 'Year' is treated as an ordered categorical variable
     spending_over_time['Year'] = pd.Categorical(
@@ -127,24 +128,24 @@ def generate_changes(path):
     # Add grid for better visualization
     plt.grid(True, linestyle='--', alpha=0.7)
 
-    # Display the plot with tight layout
+    # Use a tight layout
     plt.tight_layout()
-    plt.show()
+
+    # Save the figure as a PNG file
+    plt.savefig(os.path.join(output_dir, 'top_ten_over_time.png'))
+    plt.close()
     return
     
 def generate_volatile_changes(path):
      # Create DataFrame
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
-    for col in ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = load_operating_budget(path)
 
     # Drop rows with missing values in critical columns
     df.dropna(subset=['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget'], inplace=True)
 
     # Aggregate spending by program (sum amounts for programs with multiple entries)
-    df_grouped = df.groupby('Program', as_index=False).sum()
+    df_grouped = sum_by(df, 'Program', ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation',
+                                        'FY25 Budget']).reset_index()
 
     # Calculate year-over-year changes for each program
     df_grouped['Change_22_23'] = df_grouped['FY23 Actual Expense'] - df_grouped['FY22 Actual Expense']
@@ -212,24 +213,24 @@ def generate_volatile_changes(path):
     #print("\nTop 10 Most Volatile Programs (by absolute change):")
     #print(top_volatile[['Program', 'Total_Change']])
 
-    # Display the plot with a tight layout
+    # Use a tight layout
     plt.tight_layout()
-    plt.show()
+
+    # Save the figure as a PNG file
+    plt.savefig(os.path.join(output_dir, 'most_volatile_changes.png'))
+    plt.close()
     return
 
 def generate_stable_changes(path):
     # Create DataFrame
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
-    for col in ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = load_operating_budget(path)
 
     # Drop rows with missing values in critical columns
     df.dropna(subset=['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget'], inplace=True)
 
     # Aggregate spending by program (sum amounts for programs with multiple entries)
-    df_grouped = df.groupby('Program', as_index=False).sum()
+    df_grouped = sum_by(df, 'Program', ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation',
+                                        'FY25 Budget']).reset_index()
 
     # Calculate year-over-year changes for each program
     df_grouped['Change_22_23'] = df_grouped['FY23 Actual Expense'] - df_grouped['FY22 Actual Expense']
@@ -297,23 +298,23 @@ def generate_stable_changes(path):
     #print("\nTop 10 Least Volatile Programs (by change closest to zero):")
     #print(least_volatile[['Program', 'Total_Change']])
 
-    # Display the plot with a tight layout
+    # Use a tight layout
     plt.tight_layout()
-    plt.show()
+
+    # Save the figure as a PNG file
+    plt.savefig(os.path.join(output_dir, 'least_volatile_changes.png'))
+    plt.close()
     
 def generate_combined_changes(path):
     # Create DataFrame
-    df = pd.read_csv(path)
-
-    # Ensure spending columns are numeric
-    for col in ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget']:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    df = load_operating_budget(path)
 
     # Drop rows with missing values in critical columns
     df.dropna(subset=['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation', 'FY25 Budget'], inplace=True)
 
     # Aggregate spending by program (sum amounts for programs with multiple entries)
-    df_grouped = df.groupby('Program', as_index=False).sum()
+    df_grouped = sum_by(df, 'Program', ['FY22 Actual Expense', 'FY23 Actual Expense', 'FY24 Appropriation',
+                                        'FY25 Budget']).reset_index()
 
     # Calculate year-over-year changes for each program
     df_grouped['Change_22_23'] = df_grouped['FY23 Actual Expense'] - df_grouped['FY22 Actual Expense']
@@ -382,17 +383,20 @@ def generate_combined_changes(path):
     # Add grid for better visualization
     plt.grid(True, linestyle='--', alpha=0.7)
 
-    # Display the plot with a tight layout
+    # Use a tight layout
     plt.tight_layout()
-    plt.show()
+
+    # Save the figure as a PNG file
+    plt.savefig(os.path.join(output_dir, 'change_comparison.png'))
+    plt.close()
     return
 
-def main():
-    #generate_visualization("./data/fy25-adopted-operating-budget.csv")
-    #generate_changes("./data/fy25-adopted-operating-budget.csv")
-    #generate_volatile_changes("./data/fy25-adopted-operating-budget.csv")
-    #generate_stable_changes("./data/fy25-adopted-operating-budget.csv")
-    #generate_combined_changes("./data/fy25-adopted-operating-budget.csv")
-    pass
+def generate_charts(path):
+    generate_visualization(path)
+    generate_changes(path)
+    generate_volatile_changes(path)
+    generate_stable_changes(path)
+    generate_combined_changes(path)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    generate_charts(OPERATING_BUDGET_PATH)
@@ -0,0 +1,325 @@
+import argparse
+import ast
+import glob
+import hashlib
+import importlib
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Charts are written to files, never drawn on screen, in the worker processes
+os.environ.setdefault("MPLBACKEND", "Agg")
+os.environ.setdefault("PLOTLY_HEADLESS", "1")
+
+OPERATING_BUDGET = "./data/fy25-adopted-operating-budget.csv"
+METRO_BUDGETS = "./data/MajorMetroCityBudgets.csv"
+REVISIONS = "./data/budget_revisions_by_major_class.csv"
+CAPITAL_PLAN = "./data/fy25-fy29-capital-budget-plan-adopted.csv"
+
+# Hyperparameters saved by models.tuning for the pooled and the Boston forecaster
+TUNED_PARAMS_ALL = "./models/artifacts/gbm_all.gbm.params.json"
+TUNED_PARAMS_BOSTON = "./models/artifacts/gbm_MA__Boston.gbm.params.json"
+
+# What every task was last built from and the files it wrote
+MANIFEST_PATH = "./data/.cache/artifact_manifest.json"
+
+# One generator call: target is "module:function", deps are task names that must finish first,
+# inputs are the data files it reads (a missing optional one is hashed as absent), outputs the
+# files (or glob patterns) it writes, and sources any modules it loads dynamically (the target's
+# own imports are found automatically)
+Task = namedtuple("Task", ["name", "target", "args", "deps", "inputs", "outputs", "sources"],
+                  defaults=((), (), ()))
+
+
+def interactive_figures(directory, names):
+    return tuple(os.path.join(directory, f"{name}.{fmt}") for name in names for fmt in ("html", "png"))
+
+
+TASKS = [
+    # Parse the operating budget once so every other task reads the Parquet cache
+    Task("data", "common.loaders:load_operating_budget", (OPERATING_BUDGET,), (),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./data/.cache/fy25-adopted-operating-budget-*.parquet",)),
+
+    Task("cabinet.report", "cabinet.cabinet_breakdown:generate_report", (OPERATING_BUDGET,), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./cabinet/cabinet_report.txt",)),
+    Task("cabinet.charts", "cabinet.cabinet_visuals:main", (), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./cabinet/visualizations/fy25_budget_projections_by_cabinet.png",
+                  "./cabinet/visualizations/spending_over_time_by_cabinet.png")),
+
+    Task("program.report", "program.program_breakdown:generate_report", (OPERATING_BUDGET,), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./program/budget_report.txt",)),
+    Task("program.charts", "program.spending_by_budget:generate_charts", (OPERATING_BUDGET,), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=tuple(f"./program/visualizations/{name}.png" for name in [
+             "predicted_budget", "top_ten_over_time", "most_volatile_changes", "least_volatile_changes",
+             "change_comparison"])),
+
+    Task("expenseCategory.report", "expenseCategory.expenseCategory_breakdown:generate_report", (OPERATING_BUDGET,), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./expenseCategory/expenseCategory_report.txt",)),
+    Task("expenseCategory.charts", "expenseCategory.expenseCategory_visuals:main", (), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=("./expenseCategory/visualizations/fy25_budget_projections_by_expense_category.png",
+                  "./expenseCategory/visualizations/spending_over_time_by_expense_category.png")),
+
+    Task("capital.report", "capital.capital_plan:generate_report", (CAPITAL_PLAN,), (),
+         inputs=(CAPITAL_PLAN,),
+         outputs=("./capital/capital_report.txt",)),
+
+    # Interactive Plotly charts, one task per chart script so they run in parallel;
+    # each task writes its figures in one batch with a single warm Kaleido renderer
+    Task("cabinet.interactive", "common.plotly_export:export_script", ("cabinet.cabinet_visuals_interactive",),
+         ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=interactive_figures("./cabinet/visualizations", [
+             "fy25_budget_projections_by_cabinet_interactive",
+             "spending_over_time_by_cabinet_interactive"]),
+         sources=("cabinet.cabinet_visuals_interactive",)),
+    Task("expenseCategory.interactive", "common.plotly_export:export_script",
+         ("expenseCategory.expenseCategory_interactive_visuals",), ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=interactive_figures("./expenseCategory/visualizations", [
+             "fy25_budget_by_expenseCategory_PieChart_interactive",
+             "expenseCategory_spending_over_time_interactive"]),
+         sources=("expenseCategory.expenseCategory_interactive_visuals",)),
+    Task("program.interactive", "common.plotly_export:export_script", ("program.budget_by_program_interactive",),
+         ("data",),
+         inputs=(OPERATING_BUDGET,),
+         outputs=interactive_figures("./program/visualizations/interactive", [
+             "budget_by_program_interactive_pie",
+             "budget_by_program_over_time_interactive",
+             "most_volatile_changes_program_interactive",
+             "least_volatile_changes_program_interactive",
+             "volatility_comparison_by_program_interactive"]),
+         sources=("program.budget_by_program_interactive",)),
+    Task("models.revisions.interactive", "common.plotly_export:export_script", ("models.price_predicatability",), (),
+         inputs=(REVISIONS,),
+         outputs=interactive_figures("./models/visualizations", ["proposed_vs_revised_interactive"]),
+         sources=("models.price_predicatability",)),
+
+    Task("models.train", "models.budget_modelling:train_models", (), (),
+         inputs=(METRO_BUDGETS, TUNED_PARAMS_ALL, TUNED_PARAMS_BOSTON),
+         outputs=("./models/artifacts/gbm_MA__Boston_intervals-*.joblib",)),
+    # Rolling-origin backtest of the GBM forecaster, error by horizon
+    Task("models.backtest", "models.backtest:export_backtest", (), (),
+         inputs=(METRO_BUDGETS,),
+         outputs=("./models/artifacts/backtest_by_series.csv",
+                  "./models/artifacts/backtest_by_horizon.csv")),
+    Task("models.revisions", "models.revision_analytics:export_revision_analytics", (), (),
+         inputs=(REVISIONS,),
+         outputs=("./models/artifacts/revision_metrics.parquet",
+                  "./models/artifacts/revision_predictability_ranking.parquet")),
+    Task("models.forecast", "models.budget_modelling:export_future_predictions", (), ("models.train",),
+         inputs=(METRO_BUDGETS, OPERATING_BUDGET, TUNED_PARAMS_BOSTON),
+         outputs=("./models/model_examples/Example_Future_Boston_Output.csv",)),
+]
+
+
+def file_digest(path):
+    # SHA-256 of a file's bytes (kept here rather than imported from common.loaders,
+    # which would load pandas just to check whether anything needs rebuilding)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def module_path(module_name):
+    # Source file of a module in this repository, or None for installed packages
+    base = module_name.replace(".", os.sep)
+    for path in (base + ".py", os.path.join(base, "__init__.py")):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def source_files(module_names):
+    # The modules' source files plus every repository module they import, recursively
+    found = set()
+    pending = list(module_names)
+    while pending:
+        path = module_path(pending.pop())
+        if path is None or path in found:
+            continue
+        found.add(path)
+        with open(path, "rb") as file:
+            tree = ast.parse(file.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                pending.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                pending.append(node.module)
+                pending.extend(f"{node.module}.{alias.name}" for alias in node.names)
+    return sorted(found)
+
+
+def task_keys(tasks):
+    # Hash of everything a task's outputs depend on: its target and arguments, the
+    # contents of its input files and generator sources, and the keys of its
+    # dependencies (so a rebuilt dependency makes its dependents stale too)
+    digests = {}
+    keys = {}
+    for task in tasks:
+        sources = source_files([task.target.split(":")[0], *task.sources])
+        for path in [*task.inputs, *sources]:
+            if path not in digests:
+                digests[path] = file_digest(path) if os.path.exists(path) else None
+        fingerprint = {
+            "target": task.target,
+            "args": repr(task.args),
+            "inputs": {path: digests[path] for path in task.inputs},
+            "sources": {path: digests[path] for path in sources},
+            "deps": {dep: keys.get(dep) for dep in task.deps},
+        }
+        keys[task.name] = hashlib.sha256(json.dumps(fingerprint, sort_keys=True).encode()).hexdigest()
+    return keys
+
+
+def output_files(task):
+    # Files currently matching the task's outputs, with their size and modification time
+    files = {}
+    for pattern in task.outputs:
+        for path in glob.glob(pattern):
+            stat = os.stat(path)
+            files[path] = [stat.st_size, stat.st_mtime_ns]
+    return files
+
+
+def is_fresh(task, key, entry):
+    # Up to date when it was built from the same key and every output it wrote is
+    # still there, untouched, and every declared output still exists
+    if not entry or entry["key"] != key:
+        return False
+    current = output_files(task)
+    if any(not glob.glob(pattern) for pattern in task.outputs):
+        return False
+    return all(current.get(path) == stat for path, stat in entry["outputs"].items())
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+
+
+def run_task(target, args):
+    # Runs in a worker process; returns the time the generator took
+    module_name, function_name = target.split(":")
+    start = time.perf_counter()
+    function = getattr(importlib.import_module(module_name), function_name)
+    function(*args)
+    return time.perf_counter() - start
+
+
+def select_tasks(tasks, names):
+    # The requested tasks plus everything they depend on (all tasks when names is empty)
+    by_name = {task.name: task for task in tasks}
+    if not names:
+        return list(tasks)
+
+    selected = set()
+    pending = list(names)
+    while pending:
+        name = pending.pop()
+        if name not in by_name:
+            raise ValueError(f"Unknown task: {name}")
+        if name not in selected:
+            selected.add(name)
+            pending.extend(by_name[name].deps)
+    return [task for task in tasks if task.name in selected]
+
+
+def run(tasks, jobs=None, force=False, manifest_path=MANIFEST_PATH):
+    # Run the task graph on a process pool: a task starts as soon as all of its
+    # dependencies have finished, and is skipped if any of them failed. Tasks whose
+    # inputs, arguments and sources match the manifest and whose outputs are intact
+    # are not run at all (unless force is set)
+    start = time.perf_counter()
+    manifest = load_manifest(manifest_path)
+    keys = task_keys(tasks)
+
+    waiting = {}
+    up_to_date = set()
+    for task in tasks:
+        if not force and is_fresh(task, keys[task.name], manifest.get(task.name)):
+            up_to_date.add(task.name)
+        else:
+            waiting[task.name] = task
+    timings = {}
+    failed = {}
+    running = {}
+
+    if waiting:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            while waiting or running:
+                for name, task in list(waiting.items()):
+                    if any(dep in failed for dep in task.deps):
+                        failed[name] = "skipped (dependency failed)"
+                        del waiting[name]
+                    elif all(dep in timings or dep in up_to_date for dep in task.deps):
+                        running[pool.submit(run_task, task.target, task.args)] = task
+                        del waiting[name]
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    name = task.name
+                    try:
+                        timings[name] = future.result()
+                        print(f"{name:<30} {timings[name]:8.2f}s")
+                        manifest[name] = {"key": keys[name], "outputs": output_files(task)}
+                    except Exception as error:
+                        failed[name] = f"{type(error).__name__}: {error}"
+                        manifest.pop(name, None)
+                        print(f"{name:<30}   FAILED  {failed[name]}")
+        save_manifest(manifest, manifest_path)
+    wall_time = time.perf_counter() - start
+
+    print(f"\n{len(timings)} tasks done, {len(up_to_date)} up to date, {len(failed)} failed or skipped")
+    print(f"Wall time: {wall_time:.2f}s (sum of task times: {sum(timings.values()):.2f}s)")
+    return timings, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate the reports, charts and model outputs")
+    parser.add_argument("tasks", nargs="*", help="tasks to run, with their dependencies (default: all)")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="stream the operating budget through the reports this many rows at a time")
+    parser.add_argument("--force", action="store_true", help="rebuild even the tasks that are up to date")
+    parser.add_argument("--list", action="store_true", help="list the tasks and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for task in TASKS:
+            deps = f"  (after {', '.join(task.deps)})" if task.deps else ""
+            print(f"{task.name}{deps}")
+        return
+
+    if args.chunksize:
+        # Read by common.loaders in the worker processes
+        os.environ["BUDGET_CHUNKSIZE"] = str(args.chunksize)
+
+    _, failed = run(select_tasks(TASKS, args.tasks), args.jobs, args.force)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()